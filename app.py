@@ -1,33 +1,2711 @@
+import time
+# Instant du lancement, pour mesurer le temps jusqu'à la première image
+STARTED_AT = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import json
 import os
+import argparse
+import bisect
+import functools
+import hashlib
+import itertools
+from contextlib import contextmanager, nullcontext
 from PIL import Image, ImageTk
+import numpy as np
 import math
+import mmap
+import queue
+import re
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    # Encodeur JSON plus rapide, utilisé pour les compactions s'il est installé
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ImagePyramid:
+    """Niveaux réduits (1, 1/2, 1/4, 1/8) d'une image, calculés à la demande
+
+    Le niveau L est l'image à l'échelle 1/2**L de l'original. Une image JPEG
+    peut n'être décodée qu'à un niveau réduit (mode draft): les niveaux plus
+    fins ne sont alors décodés depuis le fichier qu'au premier besoin.
+    """
+
+    MAX_LEVEL = 3
+
+    def __init__(self, image, level=0, size=None, path=None):
+        self.levels = {level: image}
+        # Taille de l'image originale, référence des coordonnées des keypoints
+        self.size = size or image.size
+        self.path = path
+        # Cache propriétaire, prévenu quand un nouveau niveau occupe de la mémoire
+        self.cache = None
+
+    @classmethod
+    def level_for_zoom(cls, zoom):
+        """Retourne le niveau le plus réduit dont la résolution reste suffisante pour ce zoom"""
+        level = 0
+        while level < cls.MAX_LEVEL and zoom <= 1 / 2 ** (level + 1):
+            level += 1
+        return level
+
+    def level_size(self, level):
+        """Taille de l'image au niveau donné"""
+        return -(-self.size[0] // 2 ** level), -(-self.size[1] // 2 ** level)
+
+    def get(self, level):
+        """Retourne l'image du niveau demandé, en la calculant depuis le niveau précédent"""
+        if level not in self.levels:
+            if level < min(self.levels):
+                # Zoom au-delà de la résolution décodée: relire le fichier à ce niveau
+                self.levels[level] = self._decode(level)
+            else:
+                self.levels[level] = self.get(level - 1).reduce(2)
+            if self.cache is not None:
+                self.cache.trim()
+        return self.levels[level]
+
+    def _decode(self, level):
+        """Décode le fichier directement à la résolution du niveau donné"""
+        image = Image.open(self.path)
+        target = self.level_size(level)
+        if level:
+            image.draft(image.mode, target)
+        image.load()
+        # Sans mode draft (format autre que JPEG), réduire après coup
+        factor = image.width // target[0]
+        if factor > 1:
+            image = image.reduce(factor)
+        return image
+
+    def nbytes(self):
+        """Estime la mémoire occupée par les niveaux calculés"""
+        return sum(image.width * image.height * len(image.getbands()) for image in self.levels.values())
+
+
+class PyramidCache:
+    """Cache LRU de pyramides partagé entre les images, borné par un budget en octets"""
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # Clé de l'image affichée, jamais évincée
+        self.pinned = None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Retourne la pyramide associée à la clé (ou None) et la marque comme récente"""
+        pyramid = self.entries.get(key)
+        if pyramid is not None:
+            self.entries.move_to_end(key)
+        return pyramid
+
+    def put(self, key, pyramid):
+        """Ajoute une pyramide au cache puis libère les plus anciennes si besoin"""
+        pyramid.cache = self
+        self.entries[key] = pyramid
+        self.entries.move_to_end(key)
+        self.trim()
+
+    def pin(self, key):
+        """Protège la pyramide de l'image affichée contre l'éviction"""
+        self.pinned = key
+
+    def trim(self):
+        """Évince les pyramides les moins récentes jusqu'à respecter le budget"""
+        total = sum(pyramid.nbytes() for pyramid in self.entries.values())
+        for key in list(self.entries):
+            if total <= self.max_bytes:
+                break
+            if key == self.pinned:
+                continue
+            pyramid = self.entries.pop(key)
+            pyramid.cache = None
+            total -= pyramid.nbytes()
+
+
+class Profiler:
+    """Chronométrage des gestionnaires critiques (p50/p95 glissants et trace Chrome optionnelle)"""
+
+    MAX_TRACE_EVENTS = 1_000_000
+
+    def __init__(self, window=120, trace_path=None):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+        self.trace_path = trace_path
+        self.trace_events = []
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name):
+        """Chronomètre le bloc si l'affichage ou la trace sont actifs"""
+        if not self.enabled and not self.trace_path:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            # deque.append et list.append sont sûrs depuis les threads de décodage
+            self.samples.setdefault(name, deque(maxlen=self.window)).append(end - start)
+            if self.trace_path and len(self.trace_events) < self.MAX_TRACE_EVENTS:
+                self.trace_events.append({
+                    "name": name, "cat": "app", "ph": "X",
+                    "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6,
+                    "pid": os.getpid(), "tid": threading.get_ident(),
+                })
+
+    def stats(self):
+        """Retourne {nom: (p50, p95, nombre)} en millisecondes sur la fenêtre glissante"""
+        stats = {}
+        for name, samples in list(self.samples.items()):
+            ordered = sorted(samples)
+            if ordered:
+                p50 = ordered[len(ordered) // 2] * 1000
+                p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+                stats[name] = (p50, p95, len(ordered))
+        return stats
+
+    def dump_trace(self):
+        """Écrit la trace de la session au format Chrome trace-event (chrome://tracing, Perfetto)"""
+        if not self.trace_path:
+            return
+        with open(self.trace_path, 'w') as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+
+def profiled(name):
+    """Décorateur: chronomètre une méthode avec le profiler de l'application"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.measure(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def decode_image(path, profiler=None, zoom=1.0):
+    """Décode une image dans une nouvelle pyramide, à la résolution juste suffisante pour ce zoom"""
+    with profiler.measure("decode") if profiler else nullcontext():
+        image = Image.open(path)
+        size = image.size
+        level = ImagePyramid.level_for_zoom(zoom)
+        if level:
+            # Décodage réduit dans le domaine DCT (JPEG uniquement, sans effet sinon)
+            image.draft(image.mode, (-(-size[0] // 2 ** level), -(-size[1] // 2 ** level)))
+        image.load()
+        # Niveau réellement obtenu (0 si le format ne permet pas le décodage réduit)
+        level = round(math.log2(size[0] / image.width)) if image.width else 0
+    return ImagePyramid(image, level=level, size=size, path=path)
+
+
+class ImagePrefetcher:
+    """Décode en arrière-plan les images voisines de l'image courante"""
+
+    def __init__(self, root, cache, ahead=3, behind=1, workers=2, poll_interval=30, profiler=None):
+        self.root = root
+        self.cache = cache
+        self.profiler = profiler
+        self.ahead = ahead
+        self.behind = behind
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        # Chemin -> future des décodages en cours ou en attente
+        self.pending = {}
+        # Résultats déposés par les threads, relevés dans la boucle Tk
+        self.results = queue.Queue()
+        self.generation = 0
+        self.center = None
+        self.poll_id = None
+
+    def schedule(self, index, count, path_for_index, zoom_for_index=None):
+        """Lance le décodage des images voisines de l'index donné"""
+        # Après un saut lointain, les décodages en cours ne servent plus à rien
+        if self.center is not None and abs(index - self.center) > self.ahead + self.behind:
+            self.cancel()
+        self.center = index
+
+        # Les images suivantes d'abord, puis les précédentes
+        window = [index + i for i in range(1, self.ahead + 1)] + [index - i for i in range(1, self.behind + 1)]
+        wanted = set()
+        for neighbour in window:
+            if not 0 <= neighbour < count:
+                continue
+            path = path_for_index(neighbour)
+            if not path:
+                continue
+            wanted.add(path)
+            if path in self.cache or path in self.pending:
+                continue
+            zoom = zoom_for_index(neighbour) if zoom_for_index else 1.0
+            self.pending[path] = self.executor.submit(self._decode, path, self.generation, zoom)
+
+        # Abandonner les décodages pas encore commencés sortis de la fenêtre
+        for path, future in list(self.pending.items()):
+            if path not in wanted and future.cancel():
+                del self.pending[path]
+
+        if self.pending and self.poll_id is None:
+            self.poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def take(self, path):
+        """Récupère une image en cours de décodage plutôt que de la redécoder"""
+        future = self.pending.pop(path, None)
+        if future is None or future.cancel():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def cancel(self):
+        """Annule tous les décodages en attente et ignore ceux déjà lancés"""
+        self.generation += 1
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+
+    def shutdown(self):
+        """Arrête les threads de décodage"""
+        self.cancel()
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _decode(self, path, generation, zoom):
+        """Exécuté dans un thread: décode l'image et dépose le résultat"""
+        try:
+            pyramid = decode_image(path, self.profiler, zoom)
+        except Exception:
+            pyramid = None
+        self.results.put((generation, path, pyramid))
+        return pyramid
+
+    def _poll(self):
+        """Exécuté dans la boucle Tk: range les images décodées dans le cache"""
+        self.poll_id = None
+        while True:
+            try:
+                generation, path, pyramid = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if pyramid is not None and generation == self.generation and path not in self.cache:
+                self.cache.put(path, pyramid)
+
+        self.pending = {path: future for path, future in self.pending.items() if not future.done()}
+        if self.pending:
+            self.poll_id = self.root.after(self.poll_interval, self._poll)
+
+
+def find_annotation_files(dataset_path):
+    """Retourne les chemins des fichiers JSON d'annotations du dataset, triés (un ou plusieurs fichiers)"""
+    json_files = sorted(f for f in os.listdir(dataset_path) if f.endswith('.json') and 'annotations' in f.lower())
+    return [os.path.join(dataset_path, f) for f in json_files]
+
+
+def encode_json(data, compact=True):
+    """Sérialise en JSON (bytes UTF-8), avec orjson s'il est installé"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=0 if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            # Entiers hors 64 bits, clés non textuelles...: encodeur standard
+            pass
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+class AnnotationJournal:
+    """Journal (JSON lines) des modifications, tenu à côté du fichier d'annotations"""
+
+    def __init__(self, json_path):
+        self.path = json_path + ".journal"
+        self.count = 0
+        # Fin du fichier vérifiée avant le premier ajout de la session
+        self.repaired = False
+
+    def extend(self, entries):
+        """Ajoute plusieurs modifications avec une seule synchronisation disque"""
+        if not self.repaired:
+            self.drop_torn_tail()
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(entry, separators=(',', ':')) + "\n" for entry in entries)
+            f.flush()
+            os.fsync(f.fileno())
+        self.count += len(entries)
+
+    def drop_torn_tail(self):
+        """Coupe le journal après sa dernière ligne complète, pour que le prochain ajout reste lisible"""
+        self.repaired = True
+        try:
+            with open(self.path, 'r+b') as f:
+                end = position = f.seek(0, os.SEEK_END)
+                # Remonter jusqu'au dernier saut de ligne (ou au début du fichier)
+                while position > 0:
+                    start = max(0, position - 65536)
+                    f.seek(start)
+                    newline = f.read(position - start).rfind(b'\n')
+                    if newline >= 0:
+                        position = start + newline + 1
+                        break
+                    position = start
+                if position < end:
+                    f.truncate(position)
+        except FileNotFoundError:
+            pass
+
+    def replay(self):
+        """Relit les modifications enregistrées depuis la dernière compaction"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    # Une ligne sans saut de ligne n'a pas été entièrement écrite
+                    entry = json.loads(line) if line.endswith("\n") else None
+                except json.JSONDecodeError:
+                    entry = None
+                if entry is None:
+                    # Dernière ligne tronquée par un arrêt brutal (coupée au prochain ajout)
+                    break
+                self.count += 1
+                yield entry
+
+    def clear(self):
+        """Vide le journal une fois ses modifications intégrées au fichier principal"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.count = 0
+
+
+class AnnotationStore:
+    """Index en mémoire des images et annotations d'un dataset COCO, construit une fois au chargement"""
+
+    def __init__(self, data, json_path):
+        self.data = data
+        self.json_path = json_path
+        self.journal = AnnotationJournal(json_path)
+        self.images = data['images']
+
+        # Index: id d'image -> position, id d'image -> annotations, id d'annotation -> annotation
+        self.image_index = {image['id']: i for i, image in enumerate(self.images)}
+        self.annotations_by_image = {}
+        self.annotation_by_id = {}
+        for annotation in data['annotations']:
+            self.add_to_index(annotation)
+
+        self.set_categories(data.get('categories', []))
+        # Tableau des keypoints du dataset, construit à la première demande
+        self.keypoints = None
+
+    @classmethod
+    def load(cls, json_path):
+        """Charge et indexe un fichier d'annotations COCO"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # Vérifier la structure du JSON
+        if 'images' not in data or 'annotations' not in data:
+            raise ValueError("Format JSON COCO invalide.")
+        store = cls(data, json_path)
+
+        # Réappliquer les modifications non encore compactées
+        for entry in store.journal.replay():
+            store.apply_edit(entry)
+        return store
+
+    # Un dataset chargé d'un bloc est immédiatement complet
+    complete = True
+    error = None
+    # Compactions sans indentation (fichier plus petit, écriture plus rapide)
+    compact_output = False
+
+    def __len__(self):
+        return len(self.images)
+
+    def set_categories(self, categories):
+        """Construit le schéma des keypoints par catégorie"""
+        self.categories = {category.get('id'): category for category in categories}
+        self.keypoint_names = []
+        self.skeleton = []
+        for category in self.categories.values():
+            if 'keypoints' in category:
+                self.keypoint_names = category['keypoints']
+                self.skeleton = category.get('skeleton', [])
+                break
+        # Arêtes du squelette de chaque catégorie, en paires d'index à partir de 0
+        self.skeletons = {category_id: parse_skeleton(category.get('skeleton'))
+                          for category_id, category in self.categories.items() if 'keypoints' in category}
+
+    def add_to_index(self, annotation):
+        """Référence une annotation dans les index"""
+        self.annotations_by_image.setdefault(annotation.get('image_id'), []).append(annotation)
+        if 'id' in annotation:
+            self.annotation_by_id[annotation['id']] = annotation
+
+    def image(self, index):
+        """Retourne les informations de l'image à la position donnée"""
+        return self.images[index]
+
+    def index_of_image(self, image_id):
+        """Retourne la position de l'image d'id donné (ou None)"""
+        return self.image_index.get(image_id)
+
+    def close(self):
+        """Libère les fichiers ouverts (aucun: le dataset est tout en mémoire)"""
+
+    def find_file_name(self, name, start=0):
+        """Position de la première image à partir de start dont le fichier (avec ou sans dossier) est name, ou None"""
+        for index in range(start, len(self)):
+            image = self.image(index)
+            filename = image.get('file_name') or image.get('filename') or ''
+            if name in (filename, os.path.basename(filename)):
+                return index
+        return None
+
+    def annotations_for_image(self, image_id):
+        """Retourne les annotations de l'image d'id donné"""
+        return self.annotations_by_image.get(image_id, [])
+
+    def annotation(self, annotation_id):
+        """Retourne l'annotation d'id donné (ou None)"""
+        return self.annotation_by_id.get(annotation_id)
+
+    def skeleton_for(self, category_id):
+        """Retourne les arêtes du squelette d'une catégorie (ou celles du schéma par défaut)"""
+        skeleton = self.skeletons.get(category_id)
+        if skeleton is None:
+            return parse_skeleton(self.skeleton)
+        return skeleton
+
+    def keypoint_store(self):
+        """Retourne le tableau des keypoints du dataset (construit une fois, puis tenu à jour)"""
+        if self.keypoints is None:
+            annotations = self.data['annotations']
+            self.row_by_id = {annotation['id']: row for row, annotation in enumerate(annotations)
+                              if 'id' in annotation}
+            self.keypoints = KeypointStore.from_annotations(annotations)
+        return self.keypoints
+
+    def keypoint_row(self, annotation_id):
+        """Retourne la ligne du tableau des keypoints d'une annotation (ou None)"""
+        return self.row_by_id.get(annotation_id)
+
+    def annotation_image_positions(self):
+        """Position de l'image de chaque ligne du tableau des keypoints (-1 si image inconnue)"""
+        return np.array([self.image_index.get(annotation.get('image_id'), -1)
+                         for annotation in self.data['annotations']], dtype=np.intp)
+
+    def image_sizes(self):
+        """Largeur et hauteur de chaque image (0 si inconnue)"""
+        widths = np.array([image.get('width') or 0 for image in self.images], dtype=np.float64)
+        heights = np.array([image.get('height') or 0 for image in self.images], dtype=np.float64)
+        return widths, heights
+
+    def apply_edit(self, entry):
+        """Applique une modification {"image_id", "annotations": [{"id", "keypoints"}]}"""
+        for change in entry['annotations']:
+            annotation = self.annotation(change['id'])
+            if annotation is not None:
+                annotation['keypoints'] = change['keypoints']
+                row = self.keypoint_row(change['id']) if self.keypoints is not None else None
+                if row is not None:
+                    self.keypoints.set(row, change['keypoints'])
+
+    def compact(self):
+        """Intègre le journal au fichier JSON, de façon bloquante"""
+        self.finish_compaction(self.write_compaction(self.prepare_compaction()))
+
+    def prepare_compaction(self):
+        """Prépare une compaction dans la boucle Tk; le résultat est passé à write_compaction"""
+        return True
+
+    def write_compaction(self, snapshot):
+        """Réécrit le fichier JSON complet de façon atomique puis vide le journal (thread d'écriture)
+
+        Les modifications ne remplacent que des listes de keypoints entières: le
+        fichier écrit pendant que l'utilisateur continue d'annoter reste cohérent,
+        et les modifications arrivées entre-temps sont dans le journal qui suit.
+        """
+        directory = os.path.dirname(os.path.abspath(self.json_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".annotations-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode_json(self.data, self.compact_output))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.json_path):
+                os.chmod(temp_path, os.stat(self.json_path).st_mode & 0o777)
+            # Le renommage remplace le fichier d'un coup: jamais de fichier à moitié écrit
+            os.replace(temp_path, self.json_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.journal.clear()
+
+    def finish_compaction(self, result):
+        """Prend en compte le fichier réécrit, dans la boucle Tk"""
+
+
+class CocoStreamReader:
+    """Parcourt un fichier COCO sans le charger entièrement en mémoire
+
+    Produit des événements ('meta', clé, valeur), ('key', clé) en début des
+    tableaux images/annotations, puis (clé, élément, position, longueur) pour
+    chacun de leurs éléments, avec sa position en octets dans le fichier.
+    """
+
+    CHUNK_SIZE = 1 << 20
+    STREAMED_KEYS = ('images', 'annotations')
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, path):
+        self.path = path
+        self.decoder = json.JSONDecoder()
+
+    def events(self):
+        # newline='' pour que les positions en caractères correspondent au fichier
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            self.file = f
+            self.buffer = ""
+            self.pos = 0
+            # Position déjà convertie en octets: self.mark (caractères) <-> self.byte_pos
+            self.mark = 0
+            self.byte_pos = 0
+            self.eof = False
+
+            self._expect('{')
+            while True:
+                char = self._next_char()
+                if char == '}':
+                    return
+                if char == ',':
+                    self.pos += 1
+                    continue
+
+                key = self._decode_value()
+                self._expect(':')
+                if key in self.STREAMED_KEYS and self._next_char() == '[':
+                    self.pos += 1
+                    yield ('key', key)
+                    yield from self._array_items(key)
+                else:
+                    yield ('meta', key, self._decode_value())
+
+    def _array_items(self, key):
+        """Parcourt les éléments d'un tableau en relevant leur position"""
+        while True:
+            char = self._next_char()
+            if char == ']':
+                self.pos += 1
+                return
+            if char == ',':
+                self.pos += 1
+                continue
+
+            start = self._byte_offset(self.pos)
+            value = self._decode_value()
+            yield (key, value, start, self._byte_offset(self.pos) - start)
+
+    def _byte_offset(self, pos):
+        """Convertit une position du tampon en position dans le fichier (en octets)"""
+        self.byte_pos += len(self.buffer[self.mark:pos].encode('utf-8'))
+        self.mark = pos
+        return self.byte_pos
+
+    def _fill(self):
+        """Lit le bloc suivant du fichier en oubliant la partie déjà traitée"""
+        if self.eof:
+            return False
+        self._byte_offset(self.pos)
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        self.mark = 0
+
+        chunk = self.file.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def _next_char(self):
+        """Retourne le prochain caractère significatif sans le consommer"""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Fin inattendue du fichier JSON.")
+
+    def _expect(self, char):
+        if self._next_char() != char:
+            raise ValueError(f"Format JSON COCO invalide (attendu {char!r}).")
+        self.pos += 1
+
+    def _decode_value(self):
+        """Décode la valeur JSON suivante, en lisant la suite du fichier si besoin"""
+        self._next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un nombre en fin de tampon peut encore continuer dans le bloc suivant
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+class SidecarIndex:
+    """Index binaire (fichier .idx) d'un fichier COCO, projeté en mémoire à l'ouverture
+
+    Contient la table des images, la position de chaque annotation dans le JSON
+    et un tableau de keypoints (annotations x K x 3, float32, complété par NaN).
+    Il n'est valable que pour la taille et la date de modification du JSON
+    enregistrées dans son en-tête.
+    """
+
+    MAGIC = b'COCOIDX1'
+    # Magic, ordre des octets, taille et mtime_ns du JSON, nombre d'images et d'annotations,
+    # valeurs de keypoints par annotation (K x 3), longueur des métadonnées
+    HEADER = struct.Struct('<8sB7xQqQQQQ')
+    # Colonnes, dans l'ordre du fichier: (nom, type au sens du module array)
+    COLUMNS = (
+        ('image_id', 'q'), ('image_width', 'i'), ('image_height', 'i'),
+        ('image_offset', 'Q'), ('image_length', 'I'),
+        # Ids triés et position correspondante, pour la recherche par dichotomie
+        ('image_sorted_id', 'q'), ('image_sorted_index', 'I'),
+        # Rangs des annotations de l'image i: image_annotations[image_start[i]:image_start[i + 1]]
+        ('image_start', 'Q'), ('image_annotations', 'I'),
+        ('annotation_id', 'q'), ('annotation_image_id', 'q'),
+        ('annotation_offset', 'Q'), ('annotation_length', 'I'), ('annotation_keypoint_count', 'I'),
+        ('annotation_sorted_id', 'q'), ('annotation_sorted_ordinal', 'I'),
+        ('keypoint_values', 'f'),
+    )
+    # Position et nombre d'éléments de chaque colonne
+    SECTIONS = struct.Struct('<' + 'QQ' * len(COLUMNS))
+    # Id absent (ou null) dans le JSON
+    MISSING_ID = -2 ** 63
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        if len(buffer) < self.HEADER.size + self.SECTIONS.size:
+            raise ValueError("Index COCO invalide.")
+        (magic, big_endian, self.json_size, self.json_mtime_ns, self.image_count,
+         self.annotation_count, self.keypoint_width, meta_length) = self.HEADER.unpack_from(buffer)
+        if magic != self.MAGIC or big_endian != (sys.byteorder == 'big'):
+            raise ValueError("Index COCO invalide.")
+
+        start = self.HEADER.size + self.SECTIONS.size
+        meta = json.loads(bytes(buffer[start:start + meta_length]))
+        self.key_order = meta['key_order']
+        self.meta = meta['meta']
+
+        # Vues sur le fichier projeté: rien n'est copié ni lu avant usage
+        self.views = [memoryview(buffer)]
+        sections = self.SECTIONS.unpack_from(buffer, self.HEADER.size)
+        for i, (name, typecode) in enumerate(self.COLUMNS):
+            offset, count = sections[2 * i], sections[2 * i + 1]
+            end = offset + count * array(typecode).itemsize
+            if end > len(buffer):
+                raise ValueError("Index COCO tronqué.")
+            view = self.views[0][offset:end].cast(typecode)
+            self.views.append(view)
+            setattr(self, name, view)
+
+    @staticmethod
+    def path_for(json_path):
+        return json_path + ".idx"
+
+    @classmethod
+    def open(cls, json_path):
+        """Projette en mémoire l'index du fichier JSON s'il est à jour, sinon retourne None"""
+        try:
+            stat = os.stat(json_path)
+            with open(cls.path_for(json_path), 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            index = cls(mapping)
+        except (ValueError, KeyError, TypeError):
+            mapping.close()
+            return None
+        if (index.json_size, index.json_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            # Le JSON a été modifié depuis la construction de l'index
+            index.close()
+            return None
+        return index
+
+    def close(self):
+        try:
+            for view in reversed(self.views):
+                view.release()
+            self.views = []
+            if isinstance(self.buffer, mmap.mmap):
+                self.buffer.close()
+        except BufferError:
+            # Tableau encore utilisé ailleurs: la projection sera libérée avec lui
+            return
+
+    def find_image(self, image_id):
+        """Retourne la position de l'image d'id donné (ou None)"""
+        if not isinstance(image_id, int):
+            return None
+        position = bisect.bisect_left(self.image_sorted_id, image_id)
+        if position < len(self.image_sorted_id) and self.image_sorted_id[position] == image_id:
+            return self.image_sorted_index[position]
+        return None
+
+    def find_annotation(self, annotation_id):
+        """Retourne le rang de l'annotation d'id donné (ou None)"""
+        if not isinstance(annotation_id, int):
+            return None
+        position = bisect.bisect_left(self.annotation_sorted_id, annotation_id)
+        if position < len(self.annotation_sorted_id) and self.annotation_sorted_id[position] == annotation_id:
+            return self.annotation_sorted_ordinal[position]
+        return None
+
+    def annotation_ordinals(self, index):
+        """Retourne les rangs des annotations de l'image à la position donnée"""
+        return self.image_annotations[self.image_start[index]:self.image_start[index + 1]].tolist()
+
+
+
+class SidecarIndexBuilder:
+    """Rassemble les colonnes d'un SidecarIndex puis écrit le fichier d'un bloc"""
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        stat = os.stat(json_path)
+        self.json_stat = (stat.st_size, stat.st_mtime_ns)
+        self.key_order = []
+        self.meta = {}
+
+        self.image_id = array('q')
+        self.image_width = array('i')
+        self.image_height = array('i')
+        self.image_offset = array('Q')
+        self.image_length = array('I')
+        self.annotation_id = array('q')
+        self.annotation_image_id = array('q')
+        self.annotation_offset = array('Q')
+        self.annotation_length = array('I')
+        # Keypoints mis bout à bout, repérés par leur début et leur nombre
+        self.keypoint_values = array('f')
+        self.keypoint_start = array('Q')
+        self.annotation_keypoint_count = array('I')
+
+    @classmethod
+    def build(cls, json_path):
+        """Construit l'index d'un fichier COCO (exécuté en arrière-plan); retourne True si écrit"""
+        try:
+            builder = cls(json_path)
+            for event in CocoStreamReader(json_path).events():
+                builder.add(event)
+            return builder.write()
+        except (OSError, ValueError, TypeError):
+            # L'index n'est qu'un accélérateur: le dataset reste utilisable sans
+            return False
+
+    @classmethod
+    def from_index(cls, json_path, index):
+        """Reprend les colonnes d'un index ouvert, pour le réécrire après compaction"""
+        builder = cls(json_path)
+        builder.key_order = list(index.key_order)
+        builder.meta = dict(index.meta)
+        for name in ('image_id', 'image_width', 'image_height', 'image_offset', 'image_length',
+                     'annotation_id', 'annotation_image_id', 'annotation_offset', 'annotation_length',
+                     'annotation_keypoint_count', 'keypoint_values'):
+            getattr(builder, name).frombytes(getattr(index, name).tobytes())
+        builder.keypoint_start = array('Q', (ordinal * index.keypoint_width
+                                             for ordinal in range(index.annotation_count)))
+        return builder
+
+    @staticmethod
+    def _id(value):
+        if value is None:
+            return SidecarIndex.MISSING_ID
+        if not isinstance(value, int):
+            raise ValueError(f"Id non entier: {value!r}")
+        return value
+
+    def add(self, event):
+        """Intègre un événement de CocoStreamReader"""
+        kind = event[0]
+        if kind == 'key':
+            self.key_order.append(event[1])
+        elif kind == 'meta':
+            _, key, value = event
+            self.key_order.append(key)
+            self.meta[key] = value
+        elif kind == 'images':
+            _, image, offset, length = event
+            self.image_id.append(self._id(image.get('id')))
+            self.image_width.append(int(image.get('width') or 0))
+            self.image_height.append(int(image.get('height') or 0))
+            self.image_offset.append(offset)
+            self.image_length.append(length)
+        elif kind == 'annotations':
+            _, annotation, offset, length = event
+            self.annotation_id.append(self._id(annotation.get('id')))
+            self.annotation_image_id.append(self._id(annotation.get('image_id')))
+            self.annotation_offset.append(offset)
+            self.annotation_length.append(length)
+            self.set_keypoints(len(self.annotation_id) - 1, annotation.get('keypoints') or [])
+
+    def set_keypoints(self, ordinal, keypoints):
+        """Enregistre les keypoints d'une annotation (ajoutée ou modifiée)"""
+        if ordinal == len(self.keypoint_start):
+            self.keypoint_start.append(len(self.keypoint_values))
+            self.annotation_keypoint_count.append(len(keypoints))
+        elif len(keypoints) <= self.annotation_keypoint_count[ordinal]:
+            # Tient à la place des anciennes valeurs: réécrit sur place
+            start = self.keypoint_start[ordinal]
+            self.keypoint_values[start:start + len(keypoints)] = array('f', keypoints)
+            self.annotation_keypoint_count[ordinal] = len(keypoints)
+            return
+        else:
+            self.keypoint_start[ordinal] = len(self.keypoint_values)
+            self.annotation_keypoint_count[ordinal] = len(keypoints)
+        self.keypoint_values.extend(keypoints)
+
+    def _repack_keypoints(self):
+        """Recopie les keypoints bout à bout, sans les valeurs remplacées par des modifications"""
+        values = array('f')
+        for ordinal, (start, count) in enumerate(zip(self.keypoint_start, self.annotation_keypoint_count)):
+            self.keypoint_start[ordinal] = len(values)
+            values.extend(self.keypoint_values[start:start + count])
+        self.keypoint_values = values
+
+    def relocate(self, image_locations, annotation_locations, keypoints_by_ordinal):
+        """Reporte les positions du JSON réécrit par une compaction et les keypoints modifiés"""
+        self.image_offset = array('Q', (offset for offset, _ in image_locations))
+        self.image_length = array('I', (length for _, length in image_locations))
+        self.annotation_offset = array('Q', (offset for offset, _ in annotation_locations))
+        self.annotation_length = array('I', (length for _, length in annotation_locations))
+        for ordinal, keypoints in keypoints_by_ordinal.items():
+            self.set_keypoints(ordinal, keypoints)
+        # Le builder d'un store en flux sert à toutes les compactions de la session: ne pas le laisser grossir
+        if len(self.keypoint_values) > 2 * sum(self.annotation_keypoint_count):
+            self._repack_keypoints()
+        stat = os.stat(self.json_path)
+        self.json_stat = (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _sorted_ids(ids):
+        """Ids triés (sans les ids absents) et position de chacun"""
+        order = sorted((i for i in range(len(ids)) if ids[i] != SidecarIndex.MISSING_ID), key=ids.__getitem__)
+        return array('q', (ids[i] for i in order)), array('I', order)
+
+    def serialize(self):
+        """Retourne le contenu du fichier d'index"""
+        image_count = len(self.image_id)
+        annotation_count = len(self.annotation_id)
+
+        # Regroupement des annotations par image (tri par dénombrement)
+        image_sorted_id, image_sorted_index = self._sorted_ids(self.image_id)
+        index_of = dict(zip(image_sorted_id, image_sorted_index))
+        image_of = [index_of.get(image_id) for image_id in self.annotation_image_id]
+        image_start = array('Q', [0]) * (image_count + 1)
+        for index in image_of:
+            if index is not None:
+                image_start[index + 1] += 1
+        for index in range(image_count):
+            image_start[index + 1] += image_start[index]
+        image_annotations = array('I', [0]) * image_start[image_count]
+        fill = image_start[:image_count]
+        for ordinal, index in enumerate(image_of):
+            if index is not None:
+                image_annotations[fill[index]] = ordinal
+                fill[index] += 1
+        annotation_sorted_id, annotation_sorted_ordinal = self._sorted_ids(self.annotation_id)
+
+        # Tableau dense annotations x K x 3
+        width = -(-max(self.annotation_keypoint_count, default=0) // 3) * 3
+        keypoint_values = array('f', [math.nan]) * (annotation_count * width)
+        for ordinal in range(annotation_count):
+            start, count = self.keypoint_start[ordinal], self.annotation_keypoint_count[ordinal]
+            keypoint_values[ordinal * width:ordinal * width + count] = self.keypoint_values[start:start + count]
+            if count % 3 == 2:
+                # Dernier point sans visibilité: visible par défaut, comme dans parse_keypoints
+                keypoint_values[ordinal * width + count] = 2
+
+        columns = {
+            'image_sorted_id': image_sorted_id, 'image_sorted_index': image_sorted_index,
+            'image_start': image_start, 'image_annotations': image_annotations,
+            'annotation_sorted_id': annotation_sorted_id, 'annotation_sorted_ordinal': annotation_sorted_ordinal,
+            'keypoint_values': keypoint_values,
+        }
+        meta = json.dumps({"key_order": self.key_order, "meta": self.meta}).encode()
+
+        # Colonnes alignées sur 8 octets après l'en-tête et les métadonnées
+        chunks = [meta]
+        sections = []
+        position = SidecarIndex.HEADER.size + SidecarIndex.SECTIONS.size + len(meta)
+        for name, typecode in SidecarIndex.COLUMNS:
+            padding = -position % 8
+            chunks.append(b'\0' * padding)
+            position += padding
+            data = columns[name] if name in columns else getattr(self, name)
+            sections += [position, len(data)]
+            chunks.append(data.tobytes())
+            position += len(chunks[-1])
+
+        header = SidecarIndex.HEADER.pack(SidecarIndex.MAGIC, sys.byteorder == 'big', *self.json_stat,
+                                          image_count, annotation_count, width, len(meta))
+        return header + SidecarIndex.SECTIONS.pack(*sections) + b''.join(chunks)
+
+    def write(self, data=None):
+        """Écrit l'index à côté du JSON, sauf si le JSON a changé depuis sa lecture"""
+        if data is None:
+            data = self.serialize()
+        stat = os.stat(self.json_path)
+        if (stat.st_size, stat.st_mtime_ns) != self.json_stat:
+            return False
+
+        path = SidecarIndex.path_for(self.json_path)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                         prefix=".annotations-", suffix=".idx.tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+
+class StreamingAnnotationStore(AnnotationStore):
+    """Variante de AnnotationStore pour les très gros fichiers
+
+    Les images et la position de chaque annotation sont indexées par un thread
+    en arrière-plan. Le contenu d'une annotation n'est lu dans le fichier qu'à
+    la première demande.
+    """
+
+    BATCH_SIZE = 1000
+    MAX_BATCHES_PER_POLL = 50
+
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.journal = AnnotationJournal(json_path)
+        self.images = []
+        self.image_index = {}
+        self.set_categories([])
+
+        # Clés du JSON dans leur ordre d'origine et valeurs hors images/annotations
+        self.key_order = []
+        self.meta = {}
+
+        # Annotations indexées par rang dans le tableau: (position, longueur) dans le fichier
+        self.locations = []
+        self.ordinal_by_id = {}
+        self.ordinals_by_image = {}
+        # Annotations déjà lues (ou modifiées), par rang
+        self.loaded = {}
+        self.source = None
+        # Index binaire construit pendant l'indexation, réécrit à chaque compaction
+        self.sidecar = None
+        self.index = None
+        self.keypoints = None
+
+        self.complete = False
+        self.error = None
+        self.batches = queue.Queue()
+
+    def start(self):
+        """Lance l'indexation en arrière-plan"""
+        threading.Thread(target=self._index, name="coco-index", daemon=True).start()
+
+    def _index(self):
+        """Exécuté dans un thread: parcourt le fichier et dépose les éléments par lots
+
+        Le même parcours construit l'index binaire qui accélérera la prochaine ouverture.
+        """
+        try:
+            images = []
+            annotations = []
+            # Premier lot d'images réduit pour afficher la première image au plus vite
+            image_batch_size = 1
+            sidecar = SidecarIndexBuilder(self.json_path)
+            for event in CocoStreamReader(self.json_path).events():
+                if sidecar is not None:
+                    try:
+                        sidecar.add(event)
+                    except (ValueError, TypeError):
+                        # Ids non entiers ou keypoints invalides: pas d'index binaire
+                        sidecar = None
+                kind = event[0]
+                if kind == 'images':
+                    images.append(event[1])
+                    if len(images) >= image_batch_size:
+                        self.batches.put(('images', images))
+                        images = []
+                        image_batch_size = min(image_batch_size * 2, self.BATCH_SIZE)
+                elif kind == 'annotations':
+                    annotation, offset, length = event[1:]
+                    annotations.append((annotation.get('id'), annotation.get('image_id'), offset, length))
+                    if len(annotations) >= self.BATCH_SIZE:
+                        self.batches.put(('annotations', annotations))
+                        annotations = []
+                else:
+                    self.batches.put(event)
+            if images:
+                self.batches.put(('images', images))
+            if annotations:
+                self.batches.put(('annotations', annotations))
+            index = None
+            if sidecar is not None:
+                data = sidecar.serialize()
+                try:
+                    sidecar.write(data)
+                    index = SidecarIndex.open(self.json_path)
+                except OSError:
+                    sidecar = None
+                if index is None:
+                    # Dossier en lecture seule: l'index reste en mémoire
+                    index = SidecarIndex(data)
+            self.batches.put(('done', sidecar, index))
+        except Exception as e:
+            self.batches.put(('error', e))
+
+    def poll(self):
+        """Exécuté dans la boucle Tk: intègre les lots indexés depuis le dernier appel"""
+        for _ in range(self.MAX_BATCHES_PER_POLL):
+            try:
+                event = self.batches.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = event[0]
+            if kind == 'key':
+                self.key_order.append(event[1])
+            elif kind == 'meta':
+                _, key, value = event
+                self.key_order.append(key)
+                self.meta[key] = value
+                if key == 'categories':
+                    self.set_categories(value)
+            elif kind == 'images':
+                for image in event[1]:
+                    self.image_index[image['id']] = len(self.images)
+                    self.images.append(image)
+            elif kind == 'annotations':
+                for annotation_id, image_id, offset, length in event[1]:
+                    ordinal = len(self.locations)
+                    self.locations.append((offset, length))
+                    self.ordinals_by_image.setdefault(image_id, []).append(ordinal)
+                    if annotation_id is not None:
+                        self.ordinal_by_id[annotation_id] = ordinal
+            elif kind == 'done':
+                if 'images' not in self.key_order or 'annotations' not in self.key_order:
+                    self.error = ValueError("Format JSON COCO invalide.")
+                    return
+                self.complete = True
+                _, self.sidecar, self.index = event
+                # Réappliquer les modifications non encore compactées
+                for entry in self.journal.replay():
+                    self.apply_edit(entry)
+            elif kind == 'error':
+                self.error = event[1]
+
+    def _load(self, ordinal):
+        """Lit une annotation dans le fichier à partir de sa position indexée"""
+        annotation = self.loaded.get(ordinal)
+        if annotation is None:
+            if self.source is None:
+                self.source = open(self.json_path, 'rb')
+            offset, length = self._location(ordinal)
+            self.source.seek(offset)
+            annotation = json.loads(self.source.read(length))
+            self.loaded[ordinal] = annotation
+        return annotation
+
+    def annotations_for_image(self, image_id):
+        """Retourne les annotations de l'image d'id donné, lues à la demande"""
+        return [self._load(ordinal) for ordinal in self._ordinals_for_image(image_id)]
+
+    def annotation(self, annotation_id):
+        """Retourne l'annotation d'id donné (ou None), lue à la demande"""
+        ordinal = self._ordinal_for_id(annotation_id)
+        if ordinal is None:
+            return None
+        return self._load(ordinal)
+
+    def keypoint_store(self):
+        """Tableau des keypoints lu dans l'index binaire, complété des annotations modifiées
+
+        Retourne None tant que l'indexation n'est pas terminée (ou sans index binaire).
+        """
+        if self.keypoints is None and self.index is not None:
+            self.keypoints = KeypointStore.from_index(self.index)
+            for ordinal, annotation in self.loaded.items():
+                self.keypoints.set(ordinal, annotation.get('keypoints') or [])
+        return self.keypoints
+
+    def keypoint_row(self, annotation_id):
+        return self._ordinal_for_id(annotation_id)
+
+    def annotation_image_positions(self):
+        positions = np.full(self._annotation_count(), -1, dtype=np.intp)
+        for image_id, ordinals in self.ordinals_by_image.items():
+            index = self.image_index.get(image_id)
+            if index is not None:
+                positions[ordinals] = index
+        return positions
+
+    def _location(self, ordinal):
+        """Position et longueur en octets d'une annotation dans le fichier"""
+        return self.locations[ordinal]
+
+    def _ordinals_for_image(self, image_id):
+        return self.ordinals_by_image.get(image_id, [])
+
+    def _ordinal_for_id(self, annotation_id):
+        return self.ordinal_by_id.get(annotation_id)
+
+    def _annotation_count(self):
+        return len(self.locations)
+
+    def _image_bytes(self, index, source):
+        """Contenu JSON d'une image, à recopier lors de la compaction"""
+        return json.dumps(self.images[index]).encode()
+
+    @staticmethod
+    def _loaded_keypoints(loaded):
+        """Keypoints des annotations lues (donc éventuellement modifiées), par rang"""
+        return {ordinal: annotation.get('keypoints') or [] for ordinal, annotation in loaded.items()}
+
+    def prepare_compaction(self):
+        """Garde l'ancien fichier ouvert: les lectures s'y poursuivent jusqu'à finish_compaction"""
+        if not self.complete:
+            return None
+        if self.source is None:
+            self.source = open(self.json_path, 'rb')
+        return True
+
+    def write_compaction(self, snapshot):
+        """Réécrit le fichier en recopiant tels quels les octets des annotations non lues (thread d'écriture)"""
+        if snapshot is None:
+            return None
+        # Copie atomique (sous le GIL) des annotations lues, modifications appliquées comprises
+        loaded = dict(self.loaded)
+
+        directory = os.path.dirname(os.path.abspath(self.json_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".annotations-", suffix=".tmp")
+        new_image_locations = []
+        new_locations = []
+        try:
+            with os.fdopen(fd, 'wb') as out, open(self.json_path, 'rb') as source:
+                out.write(b'{')
+                for i, key in enumerate(self.key_order):
+                    out.write(b',\n' if i else b'\n')
+                    out.write(json.dumps(key).encode() + b': ')
+                    if key == 'images':
+                        out.write(b'[')
+                        for index in range(len(self)):
+                            out.write(b',\n' if index else b'\n')
+                            data = self._image_bytes(index, source)
+                            new_image_locations.append((out.tell(), len(data)))
+                            out.write(data)
+                        out.write(b'\n]')
+                    elif key == 'annotations':
+                        out.write(b'[')
+                        for ordinal in range(self._annotation_count()):
+                            out.write(b',\n' if ordinal else b'\n')
+                            if ordinal in loaded:
+                                data = encode_json(loaded[ordinal])
+                            else:
+                                offset, length = self._location(ordinal)
+                                source.seek(offset)
+                                data = source.read(length)
+                            new_locations.append((out.tell(), len(data)))
+                            out.write(data)
+                        out.write(b'\n]')
+                    else:
+                        out.write(encode_json(self.meta[key]))
+                out.write(b'\n}\n')
+                out.flush()
+                os.fsync(out.fileno())
+            os.chmod(temp_path, os.stat(self.json_path).st_mode & 0o777)
+            os.replace(temp_path, self.json_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Les images et annotations ont changé de place dans le nouveau fichier
+        sidecar = self._write_sidecar(new_image_locations, new_locations, loaded)
+        self.journal.clear()
+        return new_locations, sidecar
+
+    def _write_sidecar(self, image_locations, annotation_locations, loaded):
+        """Réécrit l'index binaire pour les nouvelles positions (thread d'écriture)"""
+        if self.sidecar is not None:
+            try:
+                self.sidecar.relocate(image_locations, annotation_locations, self._loaded_keypoints(loaded))
+                self.sidecar.write()
+            except (OSError, ValueError, TypeError):
+                self.sidecar = None
+
+    def close(self):
+        """Ferme le fichier JSON et l'index binaire"""
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+        if self.index is not None:
+            # Le tableau des keypoints est une vue sur l'index
+            self.keypoints = None
+            self.index.close()
+            self.index = None
+
+    def finish_compaction(self, result):
+        """Passe au nouveau fichier et à ses positions, dans la boucle Tk"""
+        if result is None:
+            return
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+        self.locations = result[0]
+
+
+class IndexedAnnotationStore(StreamingAnnotationStore):
+    """Variante de StreamingAnnotationStore ouverte depuis un SidecarIndex à jour
+
+    L'ouverture ne lit que l'en-tête de l'index: les tables sont projetées en
+    mémoire et les images comme les annotations ne sont lues dans le JSON qu'à
+    la demande, aux positions enregistrées.
+    """
+
+    # Taille des lectures lors de la recherche d'une image par nom de fichier
+    SCAN_CHUNK_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, json_path, index):
+        super().__init__(json_path)
+        self.index = index
+        # Images déjà lues, par position
+        self.image_cache = {}
+        self.key_order = index.key_order
+        self.meta = index.meta
+        self.set_categories(self.meta.get('categories', []))
+        self.complete = True
+
+    @classmethod
+    def open(cls, json_path):
+        """Ouvre le dataset depuis son index binaire s'il est à jour, sinon retourne None"""
+        index = SidecarIndex.open(json_path)
+        if index is None:
+            return None
+        store = cls(json_path, index)
+
+        # Réappliquer les modifications non encore compactées
+        for entry in store.journal.replay():
+            store.apply_edit(entry)
+        return store
+
+    def start(self):
+        """Rien à indexer: l'index est déjà complet"""
+
+    def poll(self):
+        pass
+
+    def __len__(self):
+        return self.index.image_count
+
+    def image(self, index):
+        """Retourne les informations de l'image à la position donnée, lues à la demande"""
+        image = self.image_cache.get(index)
+        if image is None:
+            image = json.loads(self._image_bytes(index, None))
+            self.image_cache[index] = image
+        return image
+
+    def index_of_image(self, image_id):
+        return self.index.find_image(image_id)
+
+    def find_file_name(self, name, start=0):
+        """Cherche le nom dans les octets bruts des images, lus par blocs: seules celles qui le contiennent sont décodées"""
+        offsets = np.frombuffer(self.index.image_offset, dtype=np.uint64).astype(np.int64)
+        ends = offsets + np.frombuffer(self.index.image_length, dtype=np.uint32)
+        # Nom tel qu'il peut figurer dans le JSON (échappé ou non), guillemet fermant compris
+        needles = {json.dumps(name)[1:].encode(), json.dumps(name, ensure_ascii=False)[1:].encode()}
+        with open(self.json_path, 'rb') as f:
+            first = start
+            while first < len(offsets):
+                # Bloc d'images entières d'environ SCAN_CHUNK_BYTES, lues d'une traite
+                last = max(first + 1, int(np.searchsorted(ends, offsets[first] + self.SCAN_CHUNK_BYTES, 'right')))
+                base = int(offsets[first])
+                f.seek(base)
+                chunk = f.read(int(ends[last - 1]) - base)
+                found = []
+                for needle in needles:
+                    position = chunk.find(needle)
+                    while position >= 0:
+                        index = int(np.searchsorted(offsets, base + position, 'right')) - 1
+                        image = json.loads(chunk[offsets[index] - base:ends[index] - base])
+                        filename = image.get('file_name') or image.get('filename') or ''
+                        if name in (filename, os.path.basename(filename)):
+                            found.append(index)
+                            break
+                        position = chunk.find(needle, position + 1)
+                if found:
+                    return min(found)
+                first = last
+        return None
+
+    def _location(self, ordinal):
+        return self.index.annotation_offset[ordinal], self.index.annotation_length[ordinal]
+
+    def _ordinals_for_image(self, image_id):
+        index = self.index.find_image(image_id)
+        if index is None:
+            return []
+        return self.index.annotation_ordinals(index)
+
+    def _ordinal_for_id(self, annotation_id):
+        return self.index.find_annotation(annotation_id)
+
+    def _annotation_count(self):
+        return self.index.annotation_count
+
+    def annotation_image_positions(self):
+        """Calculé sur les colonnes de l'index, sans lire le JSON"""
+        sorted_ids = np.frombuffer(self.index.image_sorted_id, dtype=np.int64)
+        image_ids = np.frombuffer(self.index.annotation_image_id, dtype=np.int64)
+        if not len(sorted_ids):
+            return np.full(len(image_ids), -1, dtype=np.intp)
+        ranks = np.minimum(np.searchsorted(sorted_ids, image_ids), len(sorted_ids) - 1)
+        positions = np.frombuffer(self.index.image_sorted_index, dtype=np.uint32)[ranks].astype(np.intp)
+        return np.where(sorted_ids[ranks] == image_ids, positions, -1)
+
+    def image_sizes(self):
+        return (np.frombuffer(self.index.image_width, dtype=np.int32).astype(np.float64),
+                np.frombuffer(self.index.image_height, dtype=np.int32).astype(np.float64))
+
+    def _image_bytes(self, index, source):
+        """Octets de l'image tels qu'enregistrés dans le fichier"""
+        if source is None:
+            if self.source is None:
+                self.source = open(self.json_path, 'rb')
+            source = self.source
+        source.seek(self.index.image_offset[index])
+        return source.read(self.index.image_length[index])
+
+    def _write_sidecar(self, image_locations, annotation_locations, loaded):
+        """Réécrit l'index pour le nouveau fichier (thread d'écriture); retourne son contenu"""
+        builder = SidecarIndexBuilder.from_index(self.json_path, self.index)
+        builder.relocate(image_locations, annotation_locations, self._loaded_keypoints(loaded))
+        data = builder.serialize()
+        try:
+            builder.write(data)
+        except OSError:
+            pass
+        return data
+
+    def finish_compaction(self, result):
+        """Projette en mémoire le nouvel index, dans la boucle Tk"""
+        if result is None:
+            return
+        super().finish_compaction(result)
+        # Le tableau des keypoints est une vue sur l'ancien index: il sera relu dans le nouveau
+        self.keypoints = None
+        self.index.close()
+        self.index = SidecarIndex.open(self.json_path)
+        if self.index is None:
+            # Dossier en lecture seule: l'index reste en mémoire
+            self.index = SidecarIndex(result[1])
+
+
+def load_shard(json_path):
+    """Lit un fichier d'annotations et lui réapplique son journal (exécuté dans un processus)"""
+    store = AnnotationStore.load(json_path)
+    return store.data, store.journal.count
+
+
+class ShardJournal:
+    """Journaux des fichiers d'un dataset découpé, vus comme un seul
+
+    Chaque modification est ajoutée au journal du fichier qui contient son image.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def count(self):
+        return sum(shard.journal.count for shard in self.store.shards)
+
+    def extend(self, entries):
+        by_shard = {}
+        for entry in entries:
+            by_shard.setdefault(self.store.shard_of(entry['image_id']), []).append(entry)
+        for shard, shard_entries in by_shard.items():
+            self.store.shards[shard].journal.extend(shard_entries)
+
+    def clear(self):
+        for shard in self.store.shards:
+            shard.journal.clear()
+
+
+class ShardedAnnotationStore(AnnotationStore):
+    """Dataset découpé en plusieurs fichiers d'annotations (par caméra, par jour...), vu comme un seul
+
+    Chaque fichier est lu par un processus, puis les index globaux sont
+    construits sur la concaténation des images et des annotations, qui restent
+    les objets des fichiers. Chaque fichier garde son journal et une compaction
+    ne réécrit que les fichiers modifiés. Les ids d'images et d'annotations
+    doivent être uniques sur l'ensemble des fichiers.
+    """
+
+    # Taille totale en deçà de laquelle lancer des processus coûte plus que la lecture
+    PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, shards):
+        self.shards = shards
+        categories = {}
+        for shard in shards:
+            for category in shard.data.get('categories', []):
+                categories.setdefault(category.get('id'), category)
+        data = {
+            'images': [image for shard in shards for image in shard.images],
+            'annotations': [annotation for shard in shards for annotation in shard.data['annotations']],
+            'categories': list(categories.values()),
+        }
+        super().__init__(data, shards[0].json_path)
+        if len(self.image_index) != len(self.images):
+            raise ValueError("Ids d'images en double entre les fichiers d'annotations.")
+        if len(self.annotation_by_id) != sum('id' in annotation for annotation in data['annotations']):
+            raise ValueError("Ids d'annotations en double entre les fichiers d'annotations.")
+
+        self.journal = ShardJournal(self)
+        # Position de la première image de chaque fichier dans l'index global
+        self.shard_starts = []
+        start = 0
+        for shard in shards:
+            self.shard_starts.append(start)
+            start += len(shard.images)
+        # Modifications reçues et déjà écrites, par fichier
+        self.edit_counts = [shard.journal.count for shard in shards]
+        self.written_counts = [0] * len(shards)
+
+    @classmethod
+    def load(cls, json_paths, workers=None):
+        """Lit les fichiers en parallèle, un processus par fichier, puis les réunit"""
+        # Importés à la demande: inutiles au démarrage de l'interface
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        workers = min(workers or os.cpu_count() or 1, len(json_paths))
+        if workers > 1 and sum(os.path.getsize(json_path) for json_path in json_paths) >= cls.PARALLEL_MIN_BYTES:
+            # spawn: pas de fork d'un processus qui peut faire tourner Tk et des threads
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                loaded = list(executor.map(load_shard, json_paths))
+        else:
+            loaded = [load_shard(json_path) for json_path in json_paths]
+
+        shards = []
+        for json_path, (data, journal_count) in zip(json_paths, loaded):
+            shard = AnnotationStore(data, json_path)
+            shard.journal.count = journal_count
+            shards.append(shard)
+        return cls(shards)
+
+    def shard_of(self, image_id):
+        """Rang du fichier qui contient l'image d'id donné"""
+        index = self.image_index.get(image_id)
+        if index is None:
+            return 0
+        return bisect.bisect_right(self.shard_starts, index) - 1
+
+    def apply_edit(self, entry):
+        super().apply_edit(entry)
+        self.edit_counts[self.shard_of(entry['image_id'])] += 1
+
+    def prepare_compaction(self):
+        """Fichiers modifiés depuis leur dernière écriture, et nombre de modifications de chacun"""
+        return {shard: count for shard, (count, written) in enumerate(zip(self.edit_counts, self.written_counts))
+                if count > written}
+
+    def write_compaction(self, snapshot):
+        """Réécrit uniquement les fichiers modifiés, chacun de façon atomique avec son journal"""
+        for shard in snapshot:
+            self.shards[shard].compact_output = self.compact_output
+            self.shards[shard].write_compaction(True)
+        return snapshot
+
+    def finish_compaction(self, result):
+        for shard, count in result.items():
+            self.written_counts[shard] = max(self.written_counts[shard], count)
+
+
+class BackgroundSaver:
+    """Thread d'écriture des sauvegardes: journal et compactions, dans l'ordre des demandes
+
+    Les sauvegardes rapprochées sont regroupées: les modifications en attente
+    sont écrites ensemble au prochain passage (une seule synchronisation disque,
+    la plus récente par image), et une compaction n'est pas redemandée tant que
+    la précédente n'est pas terminée.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        # (store, id image) -> modification en attente d'écriture dans le journal
+        self.entries = OrderedDict()
+        self.flush_queued = False
+        # Store en cours de compaction, jusqu'à finish_compaction dans la boucle Tk
+        self.compacting = None
+        threading.Thread(target=self._run, name="annotation-saver", daemon=True).start()
+
+    def save(self, store, image_id, entry):
+        """Programme l'écriture d'une modification déjà appliquée en mémoire"""
+        with self.lock:
+            self.entries.pop((store, image_id), None)
+            self.entries[(store, image_id)] = entry
+            if self.flush_queued:
+                return
+            self.flush_queued = True
+        self.tasks.put(('journal', self._flush, ()))
+
+    def compact(self, store):
+        """Programme une compaction (ignorée si une compaction est déjà en cours)"""
+        if self.compacting is not None:
+            return False
+        snapshot = store.prepare_compaction()
+        self.compacting = store
+        self.tasks.put(('compact', self._compact, (store, snapshot)))
+        return True
+
+    def _flush(self):
+        with self.lock:
+            entries, self.entries = self.entries, OrderedDict()
+            self.flush_queued = False
+        by_store = {}
+        for (store, _), entry in entries.items():
+            by_store.setdefault(store, []).append(entry)
+        with self.profiler.measure("save_write") if self.profiler else nullcontext():
+            for store, store_entries in by_store.items():
+                store.journal.extend(store_entries)
+        return len(entries)
+
+    def _compact(self, store, snapshot):
+        with self.profiler.measure("compact") if self.profiler else nullcontext():
+            return store, store.write_compaction(snapshot)
+
+    def _run(self):
+        while True:
+            kind, function, args = self.tasks.get()
+            try:
+                self.results.put((kind, function(*args), None))
+            except Exception as e:
+                self.results.put((kind, args[0] if kind == 'compact' else None, e))
+            finally:
+                self.tasks.task_done()
+
+    def poll(self):
+        """Exécuté dans la boucle Tk: retourne les (type, résultat, erreur) des tâches terminées"""
+        done = []
+        while True:
+            try:
+                kind, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return done
+            if kind == 'compact':
+                self.compacting = None
+                if error is None:
+                    store, written = result
+                    store.finish_compaction(written)
+            done.append((kind, result, error))
+
+    def drain(self):
+        """Attend la fin de toutes les écritures programmées puis retourne leurs résultats"""
+        self.tasks.join()
+        return self.poll()
+
+
+# Couleurs de contour attribuées à chaque personne d'une image
+PERSON_COLORS = ["black", "cyan", "magenta", "orange", "blue", "white", "purple", "brown"]
+
+
+def parse_keypoints(keypoints_data):
+    """Découpe une liste COCO [x1, y1, v1, x2, y2, v2, ...] en tableau (n x 3) de triplets (x, y, v)"""
+    # v est un flag de visibilité (0: non marqué, 1: marqué mais non visible, 2: visible)
+    values = np.asarray(keypoints_data, dtype=np.float32).ravel()
+    count = (len(values) + 1) // 3  # Vérifier qu'il y a au moins x et y
+    points = np.full((count, 3), 2, dtype=np.float32)
+    points.ravel()[:min(len(values), count * 3)] = values[:count * 3]
+    return points
+
+
+def parse_skeleton(skeleton):
+    """Convertit les arêtes COCO [[a, b], ...] (keypoints numérotés à partir de 1) en paires d'index"""
+    return [(edge[0] - 1, edge[1] - 1) for edge in skeleton or []
+            if isinstance(edge, (list, tuple)) and len(edge) == 2 and all(isinstance(end, int) for end in edge)]
+
+
+class KeypointStore:
+    """Keypoints de tout le dataset: tableau (annotations x K x 3) float32, une ligne par annotation
+
+    Les points absents valent NaN. Le tableau peut être une vue en lecture seule
+    sur un SidecarIndex projeté en mémoire: il n'est jamais copié, les lignes
+    modifiées sont gardées à part et appliquées par-dessus à la lecture.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        # Lignes modifiées: rang -> points (n x 3) issus de parse_keypoints
+        self.edits = {}
+
+    @classmethod
+    def from_annotations(cls, annotations):
+        """Construit le tableau à partir des annotations JSON, dans leur ordre"""
+        # Toutes les listes à la suite dans un seul tableau, découpé ensuite par longueurs
+        lists = [annotation.get('keypoints') or [] for annotation in annotations]
+        lengths = np.fromiter(map(len, lists), dtype=np.intp, count=len(lists))
+        flat = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.float32, count=int(lengths.sum()))
+
+        starts = np.cumsum(lengths) - lengths
+        values = np.full((len(lists), (lengths.max(initial=0) + 1) // 3, 3), np.nan, dtype=np.float32)
+
+        # Un bloc par longueur de liste, avec les règles de parse_keypoints: un x isolé en fin
+        # de liste est ignoré, une paire (x, y) finale est visible
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            full = length // 3
+            if full:
+                points = flat[starts[rows, None] + np.arange(full * 3)]
+                values[rows, :full] = points.reshape(len(rows), full, 3)
+            if length % 3 == 2:
+                values[rows, full, :2] = flat[starts[rows, None] + np.arange(full * 3, length)]
+                values[rows, full, 2] = 2
+        return cls(values)
+
+    @classmethod
+    def from_index(cls, index):
+        """Vue sans copie sur le tableau de keypoints d'un SidecarIndex (lignes = rangs des annotations)"""
+        values = np.frombuffer(index.keypoint_values, dtype=np.float32)
+        return cls(values.reshape(index.annotation_count, index.keypoint_width // 3, 3))
+
+    def set(self, row, keypoints):
+        """Remplace les keypoints d'une annotation par une liste COCO"""
+        self.edits[row] = parse_keypoints(keypoints)
+
+    def rows(self, rows):
+        """Keypoints des lignes demandées (tableau d'entiers), modifications comprises"""
+        points = self.values[rows]
+        # Une ligne modifiée peut avoir plus de keypoints que le schéma: élargir le résultat
+        width = max(map(len, self.edits.values()), default=0) - points.shape[1]
+        if width > 0:
+            points = np.pad(points, ((0, 0), (0, width), (0, 0)), constant_values=np.nan)
+        if self.edits:
+            for position in np.flatnonzero(np.isin(rows, list(self.edits))):
+                edited = self.edits[int(rows[position])]
+                points[position] = np.nan
+                points[position, :len(edited)] = edited
+        return points
+
+    def has_keypoints(self):
+        """Indique pour chaque ligne si l'annotation a des keypoints (une personne, comme à l'affichage)"""
+        present = ~np.isnan(self.values[..., 0]).all(axis=1)
+        for row, points in self.edits.items():
+            present[row] = len(points) > 0
+        return present
+
+    def stats(self):
+        """Statistiques par keypoint sur tout le dataset: annotés, visibles et position moyenne"""
+        values = self.rows(np.arange(len(self.values))) if self.edits else self.values
+        visibility = np.nan_to_num(values[..., 2])
+        labelled = (visibility > 0) & ~np.isnan(values[..., :2]).any(axis=-1)
+        labelled_count = labelled.sum(axis=0)
+        positions = np.where(labelled[..., None], values[..., :2], 0).sum(axis=0, dtype=np.float64)
+        return {
+            'annotations': len(values),
+            'complete': int(labelled.all(axis=1).sum()) if values.shape[1] else 0,
+            'labelled': labelled_count.tolist(),
+            'visible': (labelled & (visibility == 2)).sum(axis=0).tolist(),
+            'mean': (positions / np.maximum(labelled_count, 1)[:, None]).tolist(),
+        }
+
+
+class ImageFilterIndex:
+    """Propriétés des annotations regroupées par image, pour naviguer parmi les images d'un filtre
+
+    Les lignes du tableau des keypoints sont triées par image une fois au
+    chargement: une modification ne réévalue que les lignes de l'image
+    concernée. Les images retenues sont gardées triées et un curseur suit
+    l'image affichée, si bien qu'un pas de navigation ne coûte qu'un accès.
+    """
+
+    # Distance au bord de l'image (en pixels) en deçà de laquelle un keypoint le touche
+    BORDER_MARGIN = 1.0
+    # Terme de comparaison: "left_wrist=0", "personnes>2"
+    TERM = re.compile(r'^([^\s<>=]+)(>=|<=|=|>|<)(\d+)$')
+    COMPARISONS = {'=': np.equal, '>': np.greater, '<': np.less, '>=': np.greater_equal, '<=': np.less_equal}
+
+    def __init__(self, store, image_positions, widths, heights):
+        self.store = store
+        self.image_count = len(widths)
+        # Dimensions inconnues: aucun keypoint ne touche le bord droit ou bas
+        self.widths = np.where(widths > 0, widths, np.inf)
+        self.heights = np.where(heights > 0, heights, np.inf)
+
+        # Lignes des annotations de l'image i: rows[starts[i]:starts[i + 1]]
+        rows = np.flatnonzero(image_positions >= 0)
+        self.rows = rows[np.argsort(image_positions[rows], kind='stable')]
+        self.row_images = image_positions[self.rows]
+        self.starts = np.searchsorted(self.row_images, np.arange(self.image_count + 1))
+        # Personnes: annotations avec keypoints (pas les boîtes seules ni les autres catégories)
+        people = store.keypoint_store().has_keypoints()[self.rows]
+        self.people = np.bincount(self.row_images[people], minlength=self.image_count)
+        # Images sauvegardées pendant la session
+        self.edited = np.zeros(self.image_count, dtype=bool)
+
+        self.terms = []
+        # Positions triées des images retenues, et rang de l'image affichée
+        self.matches = []
+        self.cursor = 0
+
+    @classmethod
+    def from_store(cls, store):
+        """Construit l'index d'un dataset chargé (None sans tableau des keypoints)"""
+        if not store.complete or store.keypoint_store() is None:
+            return None
+        widths, heights = store.image_sizes()
+        return cls(store, store.annotation_image_positions(), widths, heights)
+
+    @property
+    def active(self):
+        return bool(self.terms)
+
+    def parse(self, query):
+        """Traduit une requête ("left_wrist=0 personnes>2 bord non_modifiee") en termes, tous requis"""
+        terms = []
+        for word in query.split():
+            if word == 'bord':
+                terms.append(('border', None))
+            elif word == 'non_modifiee':
+                terms.append(('not_edited', None))
+            else:
+                match = self.TERM.match(word)
+                if match is None:
+                    raise ValueError(f"Terme de filtre invalide: {word}")
+                name, operator, number = match.groups()
+                if name == 'personnes':
+                    terms.append(('people', (self.COMPARISONS[operator], int(number))))
+                elif name in self.store.keypoint_names and operator == '=':
+                    terms.append(('visibility', (self.store.keypoint_names.index(name), int(number))))
+                else:
+                    raise ValueError(f"Terme de filtre invalide: {word}")
+        return terms
+
+    def set_query(self, query):
+        """Applique une requête et retourne le nombre d'images retenues (requête vide: pas de filtre)"""
+        self.terms = self.parse(query)
+        self.matches = []
+        if self.terms:
+            matched = self._evaluate(np.arange(self.image_count), self.rows, self.row_images)
+            self.matches = np.flatnonzero(matched).tolist()
+        self.cursor = 0
+        return len(self.matches)
+
+    def _evaluate(self, images, rows, local):
+        """Indique pour chaque image (positions triées) si elle vérifie tous les termes
+
+        rows sont les lignes des annotations de ces images et local, pour chaque
+        ligne, le rang de son image dans images.
+        """
+        points = self.store.keypoint_store().rows(rows)
+        result = np.ones(len(images), dtype=bool)
+        for kind, argument in self.terms:
+            if kind == 'people':
+                compare, count = argument
+                result &= compare(self.people[images], count)
+                continue
+            if kind == 'not_edited':
+                result &= ~self.edited[images]
+                continue
+
+            if kind == 'visibility':
+                keypoint, visibility = argument
+                if keypoint < points.shape[1]:
+                    row_matches = np.nan_to_num(points[:, keypoint, 2]) == visibility
+                else:
+                    # Keypoint absent de toutes les annotations: non marqué (v = 0)
+                    row_matches = np.full(len(rows), visibility == 0)
+            else:
+                labelled = (np.nan_to_num(points[..., 2]) > 0) & ~np.isnan(points[..., :2]).any(axis=-1)
+                widths = self.widths[images[local]][:, None]
+                heights = self.heights[images[local]][:, None]
+                x, y = points[..., 0], points[..., 1]
+                margin = self.BORDER_MARGIN
+                touching = (x <= margin) | (y <= margin) | (x >= widths - margin) | (y >= heights - margin)
+                row_matches = (labelled & touching).any(axis=1)
+            # Une image est retenue si au moins une de ses annotations l'est
+            result &= np.bincount(local[row_matches], minlength=len(images)) > 0
+        return result
+
+    def update(self, index):
+        """Réévalue l'image à la position donnée après la sauvegarde de ses keypoints"""
+        self.edited[index] = True
+        if not self.terms:
+            return
+        rows = self.rows[self.starts[index]:self.starts[index + 1]]
+        matched = self._evaluate(np.array([index]), rows, np.zeros(len(rows), dtype=np.intp))[0]
+        rank = bisect.bisect_left(self.matches, index)
+        present = rank < len(self.matches) and self.matches[rank] == index
+        if matched and not present:
+            self.matches.insert(rank, index)
+        elif present and not matched:
+            del self.matches[rank]
+
+    def next(self, index):
+        """Position de l'image retenue suivante (ou None)"""
+        if self.cursor < len(self.matches) and self.matches[self.cursor] == index:
+            return self._move(self.cursor + 1)
+        # Image affichée hors du filtre (saut direct ou image qui n'est plus retenue)
+        return self._move(bisect.bisect_right(self.matches, index))
+
+    def previous(self, index):
+        """Position de l'image retenue précédente (ou None)"""
+        if self.cursor < len(self.matches) and self.matches[self.cursor] == index:
+            return self._move(self.cursor - 1)
+        return self._move(bisect.bisect_left(self.matches, index) - 1)
+
+    def _move(self, rank):
+        if 0 <= rank < len(self.matches):
+            self.cursor = rank
+            return self.matches[rank]
+        return None
+
+
+class ImageKeypoints:
+    """Keypoints des personnes de l'image affichée: tableau (personnes x K x 3) float32
+
+    Se consulte comme un dictionnaire (id annotation, index) -> (x, y, visibilité)
+    pour les traitements point par point (sélection, glisser), tandis que la
+    transformation, le bornage et l'arrondi portent sur tout le tableau d'un coup.
+    """
+
+    def __init__(self, people=None):
+        # people: id annotation -> tableau (n x 3) issu de parse_keypoints
+        people = people or {}
+        self.ann_ids = list(people)
+        self.person = {ann_id: p for p, ann_id in enumerate(self.ann_ids)}
+        width = max(map(len, people.values()), default=0)
+        self.points = np.full((len(people), width, 3), np.nan, dtype=np.float32)
+        for p, points in enumerate(people.values()):
+            self.points[p, :len(points)] = points
+        self.valid = ~np.isnan(self.points[..., :2]).any(axis=-1)
+
+    def _position(self, key):
+        ann_id, idx = key
+        p = self.person.get(ann_id)
+        if p is None or not 0 <= idx < self.points.shape[1] or not self.valid[p, idx]:
+            raise KeyError(key)
+        return p, idx
+
+    def __getitem__(self, key):
+        x, y, visibility = self.points[self._position(key)].tolist()
+        return x, y, int(visibility)
+
+    def __setitem__(self, key, value):
+        self.points[self._position(key)] = value
+
+    def __contains__(self, key):
+        try:
+            self._position(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return int(self.valid.sum())
+
+    def keys(self):
+        persons, indexes = (axis.tolist() for axis in np.nonzero(self.valid))
+        return [(self.ann_ids[p], idx) for p, idx in zip(persons, indexes)]
+
+    def items(self):
+        return [(key, (x, y, int(visibility)))
+                for key, (x, y, visibility) in zip(self.keys(), self.points[self.valid].tolist())]
+
+    def clamp(self, width, height):
+        """Limite toutes les coordonnées aux dimensions de l'image"""
+        np.clip(self.points[..., 0], 0, width, out=self.points[..., 0])
+        np.clip(self.points[..., 1], 0, height, out=self.points[..., 1])
+
+    def canvas_coords(self, zoom, pan_x, pan_y):
+        """Coordonnées canvas (personnes x K x 2) de tous les points selon le zoom et le pan"""
+        return self.points[..., :2] * np.float32(zoom) + np.array([pan_x, pan_y], dtype=np.float32)
+
+    def to_coco(self, ann_id):
+        """Liste COCO arrondie des keypoints d'une personne, jusqu'au premier point absent"""
+        p = self.person[ann_id]
+        missing = np.flatnonzero(~self.valid[p])
+        count = missing[0] if len(missing) else self.points.shape[1]
+        return np.rint(self.points[p, :count]).astype(np.int64).ravel().tolist()
+
+
+class SpatialIndex:
+    """Grille de hachage des keypoints (en coordonnées image) pour la sélection à la souris"""
+
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.positions = {}
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def clear(self):
+        self.cells = {}
+        self.positions = {}
+
+    def insert(self, key, x, y):
+        self.positions[key] = (x, y)
+        self.cells.setdefault(self._cell(x, y), set()).add(key)
+
+    def remove(self, key):
+        x, y = self.positions.pop(key)
+        cell = self._cell(x, y)
+        self.cells[cell].discard(key)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def move(self, key, x, y):
+        """Met à jour la position d'un point (ne change de case que si nécessaire)"""
+        if self._cell(*self.positions[key]) == self._cell(x, y):
+            self.positions[key] = (x, y)
+        else:
+            self.remove(key)
+            self.insert(key, x, y)
+
+    def nearest(self, x, y, radius):
+        """Retourne la clé du point le plus proche dans le rayon donné (ou None)"""
+        min_cx, min_cy = self._cell(x - radius, y - radius)
+        max_cx, max_cy = self._cell(x + radius, y + radius)
+        best, best_distance = None, radius * radius
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for key in self.cells.get((cx, cy), ()):
+                    px, py = self.positions[key]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= best_distance:
+                        best, best_distance = key, distance
+        return best
+
+
+class ViewportRenderer:
+    """Affiche uniquement la zone visible de l'image (plus une marge) sur le canvas"""
+
+    def __init__(self, canvas, margin=256):
+        self.canvas = canvas
+        self.margin = margin
+        self.pyramid = None
+        self.photo_image = None
+        # Zone du canvas couverte par le dernier rendu (x1, y1, x2, y2)
+        self.rendered_box = None
+
+    def set_source(self, pyramid):
+        """Change la pyramide source et invalide le rendu courant"""
+        self.pyramid = pyramid
+        self.rendered_box = None
+
+    def viewport_size(self):
+        """Retourne la taille visible du canvas"""
+        # Avant le premier affichage, winfo_width/height valent 1
+        width = max(self.canvas.winfo_width(), self.canvas.winfo_reqwidth())
+        height = max(self.canvas.winfo_height(), self.canvas.winfo_reqheight())
+        return width, height
+
+    def render(self, zoom, pan_x, pan_y, resample=Image.Resampling.LANCZOS):
+        """Rééchantillonne la zone visible de la source pour le zoom et le pan donnés"""
+        if self.pyramid is None:
+            return
+
+        full_width, full_height = self.pyramid.size
+        view_width, view_height = self.viewport_size()
+        margin = self.margin
+        box = (-margin, -margin, view_width + margin, view_height + margin)
+
+        # Zone à couvrir, ramenée en coordonnées de l'image source
+        left = max(0, math.floor((box[0] - pan_x) / zoom))
+        top = max(0, math.floor((box[1] - pan_y) / zoom))
+        right = min(full_width, math.ceil((box[2] - pan_x) / zoom))
+        bottom = min(full_height, math.ceil((box[3] - pan_y) / zoom))
+
+        self.canvas.delete("image")
+        self.photo_image = None
+
+        if right > left and bottom > top:
+            target_width = max(1, round((right - left) * zoom))
+            target_height = max(1, round((bottom - top) * zoom))
+
+            # Partir du niveau de la pyramide le plus proche plutôt que de l'original
+            source = self.pyramid.get(self.pyramid.level_for_zoom(zoom))
+            scale_x = source.width / full_width
+            scale_y = source.height / full_height
+
+            # Seule la région recadrée est redimensionnée, jamais l'image entière
+            region = source.resize((target_width, target_height), resample,
+                                   box=(left * scale_x, top * scale_y, right * scale_x, bottom * scale_y))
+            self.photo_image = ImageTk.PhotoImage(region)
+            self.canvas.create_image(
+                round(left * zoom + pan_x), round(top * zoom + pan_y),
+                anchor=tk.NW,
+                image=self.photo_image,
+                tags=("scene", "image")
+            )
+            self.canvas.tag_lower("image")
+
+        # Hors de l'image, la zone couverte est simplement vide
+        self.rendered_box = box
+
+    def pan(self, dx, dy):
+        """Décale la zone rendue et indique si elle couvre encore toute la vue"""
+        if self.rendered_box is None:
+            return False
+
+        x1, y1, x2, y2 = self.rendered_box
+        self.rendered_box = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+
+        view_width, view_height = self.viewport_size()
+        x1, y1, x2, y2 = self.rendered_box
+        return x1 <= 0 and y1 <= 0 and x2 >= view_width and y2 >= view_height
+
+
+class ThumbnailCache:
+    """Miniatures persistantes sur disque, indexées par chemin, date de modification et taille du fichier"""
+
+    def __init__(self, cache_dir=None, size=(128, 96)):
+        if cache_dir is None:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            cache_dir = os.path.join(base, 'coco-annotation-tool', 'thumbnails')
+        self.cache_dir = cache_dir
+        self.size = size
+
+    def cache_path(self, path):
+        """Chemin de la miniature d'une image (change dès que le fichier est modifié)"""
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size[0]}x{self.size[1]}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + ".jpg")
+
+    def load(self, path):
+        """Exécuté dans un thread: lit la miniature sur disque ou la génère"""
+        cache_path = self.cache_path(path)
+        if os.path.exists(cache_path):
+            try:
+                thumbnail = Image.open(cache_path)
+                thumbnail.load()
+                return thumbnail
+            except OSError:
+                # Miniature corrompue: la régénérer
+                pass
+
+        image = Image.open(path)
+        # Décodage réduit (JPEG) au plus près de la taille de la miniature
+        image.draft('RGB', self.size)
+        image.thumbnail(self.size)
+        thumbnail = image.convert('RGB')
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                thumbnail.save(f, 'JPEG', quality=80)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return thumbnail
+
+
+class Filmstrip:
+    """Bandeau de miniatures virtualisé: seules les miniatures visibles existent sur le canvas"""
+
+    PADDING = 6
+    MEMORY_THUMBNAILS = 512
+
+    def __init__(self, parent, root, thumbnail_cache, on_select, workers=4, poll_interval=30):
+        self.root = root
+        self.cache = thumbnail_cache
+        self.on_select = on_select
+        self.poll_interval = poll_interval
+        self.cell_width = thumbnail_cache.size[0] + self.PADDING
+        self.height = thumbnail_cache.size[1] + 2 * self.PADDING + 12
+
+        self.frame = ttk.Frame(parent)
+        self.canvas = tk.Canvas(self.frame, height=self.height, bg="#303030", highlightthickness=0)
+        self.canvas.pack(fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=self.xview)
+        self.scrollbar.pack(fill=tk.X)
+
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<ButtonPress-1>", self.on_click)
+        self.canvas.bind("<Button-4>", lambda event: self.xview('scroll', -1, 'units'))
+        self.canvas.bind("<Button-5>", lambda event: self.xview('scroll', 1, 'units'))
+
+        self.count = 0
+        self.path_for_index = None
+        self.current = 0
+        self.offset = 0
+
+        # Miniatures en mémoire (LRU) et PhotoImage des seules miniatures affichées
+        self.thumbnails = OrderedDict()
+        self.photos = {}
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self.pending = {}
+        self.results = queue.Queue()
+        self.poll_id = None
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_dataset(self, count, path_for_index):
+        """Associe le bandeau à un nouveau dataset"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.thumbnails.clear()
+        self.path_for_index = path_for_index
+        self.count = count
+        self.current = 0
+        self.offset = 0
+        self.redraw()
+
+    def set_count(self, count):
+        """Met à jour le nombre d'images (indexation progressive)"""
+        if count != self.count:
+            self.count = count
+            self.redraw()
+
+    def set_current(self, index):
+        """Met en évidence l'image courante en la faisant défiler dans la vue si besoin"""
+        self.current = index
+        width = self.canvas.winfo_width()
+        left = index * self.cell_width
+        if left < self.offset or left + self.cell_width > self.offset + width:
+            self.offset = left - (width - self.cell_width) // 2
+        self.redraw()
+
+    def xview(self, *args):
+        """Défilement piloté par la barre de défilement ou la molette"""
+        width = self.canvas.winfo_width()
+        total = self.count * self.cell_width
+        if args[0] == 'moveto':
+            self.offset = float(args[1]) * total
+        elif args[0] == 'scroll':
+            step = self.cell_width if args[2] == 'units' else width
+            self.offset += int(args[1]) * step
+        self.redraw()
+
+    def on_click(self, event):
+        index = int((self.offset + event.x) // self.cell_width)
+        if 0 <= index < self.count:
+            self.on_select(index)
+
+    def visible_range(self):
+        width = self.canvas.winfo_width()
+        first = max(0, int(self.offset // self.cell_width))
+        last = min(self.count, int((self.offset + width) // self.cell_width) + 1)
+        return first, last
+
+    def redraw(self):
+        """Recrée les seuls éléments visibles et demande les miniatures manquantes"""
+        width = self.canvas.winfo_width()
+        total = self.count * self.cell_width
+        self.offset = max(0, min(self.offset, total - width))
+
+        self.canvas.delete("thumb")
+        first, last = self.visible_range()
+        photos = {}
+        for index in range(first, last):
+            x = index * self.cell_width - self.offset + self.PADDING // 2
+            y = self.PADDING
+            outline = "yellow" if index == self.current else "#505050"
+            self.canvas.create_rectangle(x - 2, y - 2, x + self.cache.size[0] + 2, y + self.cache.size[1] + 2,
+                                         outline=outline, width=2, tags="thumb")
+            self.canvas.create_text(x + self.cache.size[0] // 2, y + self.cache.size[1] + 8,
+                                    text=str(index + 1), fill="white", font=("Arial", 7), tags="thumb")
+
+            thumbnail = self.thumbnails.get(index)
+            if thumbnail is None:
+                self.request(index)
+                continue
+            self.thumbnails.move_to_end(index)
+            photo = self.photos.get(index) or ImageTk.PhotoImage(thumbnail)
+            photos[index] = photo
+            self.canvas.create_image(x + self.cache.size[0] // 2, y + self.cache.size[1] // 2,
+                                     image=photo, tags="thumb")
+        # Les PhotoImage hors de la vue sont libérées
+        self.photos = photos
+
+        # Abandonner les miniatures demandées qui ne sont plus visibles
+        for index, future in list(self.pending.items()):
+            if not first <= index < last and future.cancel():
+                del self.pending[index]
+
+        if total > 0:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + width) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def request(self, index):
+        """Demande la miniature d'une image au pool de threads"""
+        if index in self.pending or self.path_for_index is None:
+            return
+        path = self.path_for_index(index)
+        if not path:
+            return
+        self.pending[index] = self.executor.submit(self._load, index, path, self.path_for_index)
+        if self.poll_id is None:
+            self.poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def _load(self, index, path, source):
+        """Exécuté dans un thread: charge ou génère la miniature"""
+        try:
+            thumbnail = self.cache.load(path)
+        except Exception:
+            thumbnail = None
+        self.results.put((index, source, thumbnail))
+
+    def _poll(self):
+        """Exécuté dans la boucle Tk: affiche les miniatures arrivées"""
+        self.poll_id = None
+        received = False
+        while True:
+            try:
+                index, source, thumbnail = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.pop(index, None)
+            # Résultat d'un dataset précédent ou image illisible
+            if thumbnail is None or source is not self.path_for_index:
+                continue
+            self.thumbnails[index] = thumbnail
+            received = True
+        while len(self.thumbnails) > self.MEMORY_THUMBNAILS:
+            self.thumbnails.popitem(last=False)
+
+        if received:
+            self.redraw()
+        if self.pending:
+            self.poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_image_header(path):
+    """Lit les dimensions d'une image sans décoder ses pixels (exécuté dans un processus)
+
+    Retourne (taille, code d'erreur, message), la taille valant None en cas d'erreur.
+    """
+    if path is None:
+        return None, "missing_file", "Nom de fichier absent du JSON"
+    try:
+        # Image.open ne lit que l'en-tête: les pixels ne sont décodés qu'à la demande
+        with Image.open(path) as image:
+            return image.size, None, None
+    except FileNotFoundError:
+        return None, "missing_file", f"Fichier introuvable: {path}"
+    except Exception as e:
+        return None, "unreadable_image", f"Image illisible: {e}"
+
+
+def validate_dataset(dataset_path, workers=None):
+    """Vérifie tout un dataset et retourne le rapport (dictionnaire sérialisable en JSON)
+
+    Les en-têtes d'images sont lus en parallèle par un pool de processus pendant
+    que les keypoints sont contrôlés dans le processus principal.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    json_paths = find_annotation_files(dataset_path)
+    if not json_paths:
+        raise ValueError("Aucun fichier JSON d'annotations trouvé dans le dossier.")
+
+    # Dataset découpé: les fichiers sont parcourus à la suite, comme un seul
+    images = []
+    annotations = []
+    categories = []
+    edits = {}
+    for json_path in json_paths:
+        for event in CocoStreamReader(json_path).events():
+            if event[0] == 'images':
+                images.append(event[1])
+            elif event[0] == 'annotations':
+                annotation = event[1]
+                annotations.append((annotation.get('id'), annotation.get('image_id'), annotation.get('category_id'),
+                                    annotation.get('keypoints')))
+            elif event[0] == 'meta' and event[1] == 'categories':
+                categories.extend(event[2])
+        # Modifications journalisées mais pas encore compactées
+        edits.update((change['id'], change['keypoints'])
+                     for entry in AnnotationJournal(json_path).replay() for change in entry['annotations'])
+    if not images and not annotations:
+        raise ValueError("Format JSON COCO invalide.")
+    keypoint_names = {}
+    for category in categories:
+        if 'keypoints' in category:
+            keypoint_names.setdefault(category.get('id'), category['keypoints'])
+
+    paths = []
+    for image in images:
+        filename = image.get('file_name') or image.get('filename')
+        paths.append(os.path.join(dataset_path, filename) if filename else None)
+    with ProcessPoolExecutor(workers) as executor:
+        headers = executor.map(read_image_header, paths, chunksize=64)
+
+        # Regrouper les annotations par image pendant la lecture des en-têtes
+        index_of = {image.get('id'): index for index, image in enumerate(images)}
+        by_image = {}
+        orphans = []
+        for annotation in annotations:
+            index = index_of.get(annotation[1])
+            if index is None:
+                orphans.append(annotation)
+            else:
+                by_image.setdefault(index, []).append(annotation)
+        headers = list(headers)
+
+    issues = []
+
+    def report(index, code, message, annotation_id=None):
+        issue = {"index": index, "code": code, "message": message}
+        if index is not None:
+            issue["image_id"] = images[index].get('id')
+            issue["file_name"] = images[index].get('file_name') or images[index].get('filename')
+        if annotation_id is not None:
+            issue["annotation_id"] = annotation_id
+        issues.append(issue)
+
+    for index, (image, (size, code, message)) in enumerate(zip(images, headers)):
+        if code is not None:
+            report(index, code, message)
+        elif image.get('width') and image.get('height') and (image['width'], image['height']) != size:
+            report(index, "size_mismatch",
+                    f"Dimensions JSON {image['width']}x{image['height']}, image réelle {size[0]}x{size[1]}")
+        if index not in by_image:
+            report(index, "no_annotation", "Aucune annotation pour cette image")
+            continue
+
+        # Bornes de référence: taille réelle si l'image est lisible, sinon celle du JSON
+        width, height = size or (image.get('width') or 0, image.get('height') or 0)
+        for annotation_id, _, category_id, keypoints in by_image[index]:
+            keypoints = edits.get(annotation_id, keypoints)
+            if keypoints is None:
+                continue
+            points = parse_keypoints(keypoints)
+            names = keypoint_names.get(category_id)
+            if names is not None and len(keypoints) != 3 * len(names):
+                report(index, "keypoint_count_mismatch",
+                        f"{len(keypoints) / 3:g} keypoints au lieu de {len(names)}", annotation_id)
+            if width and height:
+                # Seuls les points annotés (v > 0) comptent: (0, 0, 0) désigne un point non marqué
+                labelled = points[points[:, 2] > 0]
+                outside = ((labelled[:, 0] < 0) | (labelled[:, 0] > width) |
+                           (labelled[:, 1] < 0) | (labelled[:, 1] > height))
+                if outside.any():
+                    report(index, "keypoints_out_of_bounds",
+                           f"{int(outside.sum())} keypoint(s) hors de l'image ({width}x{height})", annotation_id)
+
+    for annotation_id, image_id, _, _ in orphans:
+        report(None, "orphan_annotation", f"Annotation liée à une image inconnue (id {image_id})", annotation_id)
+
+    summary = {}
+    for issue in issues:
+        summary[issue["code"]] = summary.get(issue["code"], 0) + 1
+    return {
+        "dataset": os.path.abspath(dataset_path),
+        "annotation_files": [os.path.basename(json_path) for json_path in json_paths],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "images": len(images),
+        "annotations": len(annotations),
+        "summary": summary,
+        "issues": issues,
+    }
+
+
+def load_annotation_store(json_paths, workers=None):
+    """Ouvre les annotations sans interface: index binaire s'il est à jour, sinon chargement complet
+
+    Plusieurs fichiers forment un dataset découpé, lu en parallèle.
+    """
+    if len(json_paths) > 1:
+        return ShardedAnnotationStore.load(json_paths, workers)
+    store = IndexedAnnotationStore.open(json_paths[0])
+    if store is None:
+        store = AnnotationStore.load(json_paths[0])
+    return store
+
+
+# Nombre d'images par lot envoyé aux processus d'export
+YOLO_EXPORT_BATCH = 256
+
+
+def yolo_label_line(class_index, bbox, keypoints, width, height, keypoint_count):
+    """Ligne YOLO-pose d'une personne: classe, boîte et keypoints normalisés (ou None si vide)"""
+    points = np.zeros((keypoint_count, 3))
+    parsed = parse_keypoints(keypoints)[:keypoint_count]
+    points[:len(parsed)] = parsed
+    labelled = points[:, 2] > 0
+
+    if bbox and len(bbox) == 4 and bbox[2] > 0 and bbox[3] > 0:
+        x, y, w, h = bbox
+    elif labelled.any():
+        # Pas de boîte dans le JSON: celle qui englobe les keypoints annotés
+        (x, y), (right, bottom) = points[labelled, :2].min(axis=0), points[labelled, :2].max(axis=0)
+        w, h = right - x, bottom - y
+    else:
+        return None
+
+    box = np.clip([(x + w / 2) / width, (y + h / 2) / height, w / width, h / height], 0, 1)
+    points[:, :2] = np.clip(points[:, :2] / (width, height), 0, 1)
+    # Point non annoté: 0 0 0, comme dans les labels YOLO
+    points[~labelled] = 0
+    values = " ".join(f"{px:.6f} {py:.6f} {int(v)}" for px, py, v in points.tolist())
+    return f"{class_index} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f} {values}"
+
+
+def write_yolo_labels(batch, keypoint_count):
+    """Écrit les fichiers de labels d'un lot d'images (exécuté dans un processus)
+
+    Retourne les (nom de fichier, empreinte) des images effectivement écrites.
+    """
+    written = []
+    for filename, digest, label_path, image_path, width, height, people in batch:
+        if not width or not height:
+            # Dimensions absentes du JSON: lues dans l'en-tête de l'image
+            size, _, _ = read_image_header(image_path)
+            if size is None:
+                continue
+            width, height = size
+        lines = [yolo_label_line(class_index, bbox, keypoints, width, height, keypoint_count)
+                 for class_index, bbox, keypoints in people]
+        os.makedirs(os.path.dirname(label_path), exist_ok=True)
+        with open(label_path, 'w') as f:
+            f.writelines(line + "\n" for line in lines if line is not None)
+        written.append((filename, digest))
+    return written
+
+
+def export_yolo(dataset_path, output_dir=None, workers=None, force=False):
+    """Exporte les annotations du dataset en labels YOLO-pose (un fichier .txt par image)
+
+    Les images sont parcourues dans l'ordre et envoyées par lots à un pool de
+    processus. Un manifeste garde l'empreinte des annotations de chaque image:
+    seules les images modifiées depuis le dernier export sont réécrites.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    json_paths = find_annotation_files(dataset_path)
+    if not json_paths:
+        raise ValueError("Aucun fichier JSON d'annotations trouvé dans le dossier.")
+    store = load_annotation_store(json_paths, workers)
+    try:
+        keypoint_count = len(store.keypoint_names)
+        if not keypoint_count:
+            raise ValueError("Aucune catégorie ne définit de keypoints.")
+
+        # Classes YOLO: catégories à keypoints, par id croissant
+        classes = sorted(category_id for category_id, category in store.categories.items() if 'keypoints' in category)
+        class_of = {category_id: i for i, category_id in enumerate(classes)}
+        output_dir = output_dir or os.path.join(dataset_path, "labels")
+        manifest_path = os.path.join(output_dir, ".yolo_export.json")
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        previous = {}
+        if not force and manifest.get('classes') == classes and manifest.get('keypoints') == keypoint_count:
+            previous = manifest.get('images', {})
+
+        workers = workers or os.cpu_count() or 1
+        digests = {}
+        skipped = 0
+        batch = []
+        pending = set()
+
+        def collect(futures):
+            for future in futures:
+                digests.update(future.result())
+
+        # spawn: pas de fork d'un processus qui peut faire tourner Tk et des threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            for index in range(len(store)):
+                image = store.image(index)
+                filename = image.get('file_name') or image.get('filename')
+                if not filename:
+                    continue
+                people = [(class_of[annotation['category_id']], annotation.get('bbox'), annotation['keypoints'])
+                          for annotation in store.annotations_for_image(image['id'])
+                          if 'keypoints' in annotation and not annotation.get('iscrowd')
+                          and annotation.get('category_id') in class_of]
+                width, height = image.get('width', 0), image.get('height', 0)
+                digest = hashlib.sha1(json.dumps([width, height, people]).encode()).hexdigest()
+                label_path = os.path.join(output_dir, os.path.splitext(filename)[0] + ".txt")
+                if previous.get(filename) == digest and os.path.exists(label_path):
+                    digests[filename] = digest
+                    skipped += 1
+                    continue
+
+                batch.append((filename, digest, label_path, os.path.join(dataset_path, filename), width, height, people))
+                if len(batch) >= YOLO_EXPORT_BATCH:
+                    pending.add(executor.submit(write_yolo_labels, batch, keypoint_count))
+                    batch = []
+                    # Borner le nombre de lots en attente pour ne pas tout garder en mémoire
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+            if batch:
+                pending.add(executor.submit(write_yolo_labels, batch, keypoint_count))
+            collect(pending)
+
+        # Manifeste écrit d'un bloc: un export interrompu sera simplement refait
+        os.makedirs(output_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".yolo_export-", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"classes": classes, "keypoints": keypoint_count, "images": digests}, f)
+        os.replace(temp_path, manifest_path)
+
+        return {
+            "images": len(store),
+            "written": len(digests) - skipped,
+            "skipped": skipped,
+            "failed": len(store) - len(digests),
+            "labels": output_dir,
+        }
+    finally:
+        # Fichier JSON et index projeté en mémoire
+        store.close()
+
 
 class CocoAnnotationTool:
-    def __init__(self, root):
+    # Compaction du journal: toutes les N sauvegardes ou à intervalle régulier
+    COMPACT_EVERY = 200
+    COMPACT_INTERVAL_MS = 5 * 60 * 1000
+    # Intervalle de relève de l'indexation en arrière-plan, pendant laquelle l'édition est suspendue
+    STORE_POLL_MS = 50
+    INDEXING_STATUS = "Indexation en cours: modification possible à la fin"
+    # Sauvegarde automatique des modifications et relève du thread de sauvegarde
+    AUTOSAVE_MS = 30 * 1000
+    SAVE_POLL_MS = 100
+    # Traitement des entrées souris: une frame (~60 fps), puis rendu de qualité au repos
+    FRAME_MS = 16
+    SETTLE_MS = 150
+    
+    def __init__(self, root, pyramid_cache_bytes=512 * 1024 * 1024, prefetch_ahead=3, prefetch_behind=1,
+                 streaming_threshold_bytes=256 * 1024 * 1024, index_threshold_bytes=16 * 1024 * 1024,
+                 profile=False, trace_path=None, thumbnail_dir=None, compact_json=False, geometry="1200x800",
+                 startup_target_ms=None):
         self.root = root
         self.root.title("COCO Annotation Tool pour YOLO Pose")
-        self.root.geometry("1200x800")
+        self.root.geometry(geometry)
         
         # Variables de l'application
         self.dataset_path = ""
-        self.json_data = None
+        self.store = None
         self.current_image_index = 0
-        self.circles = []
-        self.keypoints = []
+        self.circles = {}  # (id annotation, index) -> (cercle, texte)
+        self.skeleton_lines = []  # (ligne, extrémité, extrémité) de chaque arête du squelette
+        self.edges_of = {}  # (id annotation, index) -> [(ligne, autre extrémité)]
+        self.keypoints = ImageKeypoints()  # (id annotation, index) -> (x, y, visibilité)
+        self.people = {}  # id annotation -> annotation affichée
+        self.spatial_index = SpatialIndex()
         self.circle_radius = 5
         self.zoom_factor = 1.0
         self.pan_x = 0
         self.pan_y = 0
         self.drag_data = {"x": 0, "y": 0, "item": None}
+        # Entrées cumulées en attente de la prochaine frame
+        self.frame_id = None
+        self.settle_id = None
+        self.pending_pan = [0, 0]
+        self.pending_render = False
+        self.pending_radius = None
+        self.pending_drag = None
         self.mode = "edit"  # "edit" ou "grab"
         self.keypoint_names = []  # Pour stocker les noms des keypoints
+        # Problèmes du rapport de validation chargé: index d'image -> messages
+        self.report_issues = {}
+        self.flagged = []
+        # Index des filtres de navigation, construit après le chargement du dataset
+        self.filter_index = None
+        # Image de départ demandée (numéro ou nom de fichier), cherchée pendant l'indexation en flux
+        self.pending_start = None
+        self.start_scanned = 0
+        # Temps jusqu'à la première image, affiché une fois si un objectif est donné
+        self.startup_target_ms = startup_target_ms
+        self.startup_reported = False
+        # Modifications de l'image courante non encore sauvegardées
+        self.dirty = False
+        self.compaction_requested = False
+        # Compactions sans indentation
+        self.compact_json = compact_json
+        # Export YOLO en arrière-plan: résultat déposé par le thread d'export
+        self.export_thread = None
+        self.export_results = queue.Queue()
         self.image_width = 0
         self.image_height = 0
+        # Pyramides d'images partagées entre les images, bornées en mémoire
+        self.pyramid_cache = PyramidCache(pyramid_cache_bytes)
+        # Au-delà de cette taille, le fichier JSON est indexé en flux plutôt que chargé d'un bloc
+        self.streaming_threshold_bytes = streaming_threshold_bytes
+        # Au-delà de cette taille, un index binaire est tenu à côté du fichier JSON pour le rouvrir aussitôt
+        self.index_threshold_bytes = index_threshold_bytes
+        # Miniatures persistantes du bandeau de navigation
+        self.thumbnail_cache = ThumbnailCache(thumbnail_dir)
+        # Chronométrage des gestionnaires critiques (F12 pour l'afficher)
+        self.profiler = Profiler(trace_path=trace_path)
+        self.profiler_overlay_id = None
+        # Sauvegardes écrites en arrière-plan (chronométrées par le profiler)
+        self.saver = BackgroundSaver(self.profiler)
+        # Décodage anticipé des images voisines
+        self.prefetcher = ImagePrefetcher(self.root, self.pyramid_cache, prefetch_ahead, prefetch_behind,
+                                          profiler=self.profiler)
         
         self.setup_ui()
+        self.root.bind("<F12>", self.toggle_profiler)
+        if profile:
+            self.toggle_profiler()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(self.COMPACT_INTERVAL_MS, self.periodic_compact)
+        self.root.after(self.AUTOSAVE_MS, self.autosave)
+        self.root.after(self.SAVE_POLL_MS, self.poll_saves)
     
     def setup_ui(self):
         # Frame principal
@@ -42,13 +2720,19 @@ class CocoAnnotationTool:
         self.image_frame = ttk.Frame(main_frame)
         self.image_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Bandeau de miniatures (bas)
+        self.filmstrip = Filmstrip(self.image_frame, self.root, self.thumbnail_cache, self.goto_image)
+        self.filmstrip.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+        
         # Canvas pour l'image
         self.canvas = tk.Canvas(self.image_frame, bg="gray")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.renderer = ViewportRenderer(self.canvas)
         
         # Événements du canvas
         self.canvas.bind("<ButtonPress-1>", self.on_mouse_press)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
         # Événements de la molette pour Ubuntu
         self.canvas.bind("<Button-4>", self.on_mouse_wheel_up)    # Pour Linux (scroll up)
         self.canvas.bind("<Button-5>", self.on_mouse_wheel_down)  # Pour Linux (scroll down)
@@ -74,6 +2758,25 @@ class CocoAnnotationTool:
         self.filename_label = ttk.Label(control_frame, text="Fichier: ", wraplength=180)
         self.filename_label.pack(fill=tk.X, pady=5)
         
+        # Rapport de validation: navigation entre les images signalées
+        ttk.Button(control_frame, text="Charger rapport", command=self.load_report).pack(fill=tk.X, pady=5)
+        report_frame = ttk.Frame(control_frame)
+        report_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(report_frame, text="◀ Signalée", command=self.previous_flagged).pack(side=tk.LEFT, padx=2)
+        ttk.Button(report_frame, text="Signalée ▶", command=self.next_flagged).pack(side=tk.RIGHT, padx=2)
+        self.issues_label = ttk.Label(control_frame, text="", wraplength=180, foreground="red")
+        self.issues_label.pack(fill=tk.X, pady=5)
+        
+        # Filtre: Précédent/Suivant ne parcourent que les images qui vérifient la requête
+        ttk.Label(control_frame, text="Filtre:").pack(anchor=tk.W)
+        self.filter_var = tk.StringVar(value="")
+        filter_entry = ttk.Entry(control_frame, textvariable=self.filter_var)
+        filter_entry.pack(fill=tk.X, pady=2)
+        filter_entry.bind("<Return>", self.apply_filter)
+        ttk.Button(control_frame, text="Filtrer", command=self.apply_filter).pack(fill=tk.X, pady=2)
+        self.filter_label = ttk.Label(control_frame, text="", wraplength=180)
+        self.filter_label.pack(fill=tk.X, pady=2)
+        
         # Séparateur
         ttk.Separator(control_frame, orient='horizontal').pack(fill=tk.X, pady=10)
         
@@ -136,71 +2839,203 @@ class CocoAnnotationTool:
         
         # Bouton de sauvegarde
         ttk.Button(control_frame, text="Sauvegarder", command=self.save_annotations).pack(fill=tk.X, pady=5)
+        # État de la sauvegarde (sans fenêtre modale)
+        self.save_status_label = ttk.Label(control_frame, text="", wraplength=180)
+        self.save_status_label.pack(fill=tk.X, pady=2)
+        
+        # Statistiques des keypoints sur tout le dataset
+        ttk.Button(control_frame, text="Statistiques", command=self.show_statistics).pack(fill=tk.X, pady=5)
+        
+        # Export des labels YOLO-pose
+        ttk.Button(control_frame, text="Exporter YOLO", command=self.export_yolo).pack(fill=tk.X, pady=5)
     
     def load_dataset(self):
-        """Charge un dataset COCO"""
-        self.dataset_path = filedialog.askdirectory(title="Sélectionner le dossier du dataset")
-        if not self.dataset_path:
-            return
+        """Charge un dataset COCO choisi dans une boîte de dialogue"""
+        dataset_path = filedialog.askdirectory(title="Sélectionner le dossier du dataset")
+        if dataset_path:
+            self.open_dataset(dataset_path)
+    
+    def open_dataset(self, dataset_path, start=None):
+        """Ouvre un dataset COCO sur l'image de départ donnée (numéro à partir de 1 ou nom de fichier)"""
+        # Les modifications en cours restent dans le dataset précédent
+        self.save_if_dirty()
+        self.dataset_path = dataset_path
             
-        # Trouver le fichier JSON d'annotations
-        json_files = [f for f in os.listdir(self.dataset_path) if f.endswith('.json') and 'annotations' in f.lower()]
+        # Trouver le (ou les) fichier(s) JSON d'annotations
+        json_paths = find_annotation_files(self.dataset_path)
         
-        if not json_files:
+        if not json_paths:
             messagebox.showerror("Erreur", "Aucun fichier JSON d'annotations trouvé dans le dossier.")
             return
             
-        # Charger le fichier JSON
+        # Charger et indexer le fichier JSON
         try:
-            with open(os.path.join(self.dataset_path, json_files[0]), 'r') as f:
-                self.json_data = json.load(f)
-                
-            # Vérifier la structure du JSON
-            if 'images' not in self.json_data or 'annotations' not in self.json_data:
-                messagebox.showerror("Erreur", "Format JSON COCO invalide.")
+            self.current_image_index = 0
+            self.report_issues = {}
+            self.flagged = []
+            self.filter_index = None
+            self.pending_start = start
+            self.start_scanned = 0
+            sidecar_path = None
+            json_path = json_paths[0]
+            json_size = os.path.getsize(json_path)
+            
+            # Index binaire à jour: seules les données affichées sont lues
+            sharded = len(json_paths) > 1
+            store = IndexedAnnotationStore.open(json_path) if not sharded and json_size >= self.index_threshold_bytes else None
+            if sharded:
+                # Dataset découpé: fichiers lus en parallèle, seuls les fichiers modifiés sont réécrits
+                self.store = ShardedAnnotationStore.load(json_paths)
+            elif store is not None:
+                self.store = store
+            elif json_size >= self.streaming_threshold_bytes:
+                # Gros fichier: la première image s'affiche dès qu'elle est indexée
+                self.store = StreamingAnnotationStore(json_path)
+                self.store.compact_output = self.compact_json
+                self.filmstrip.set_dataset(0, self.image_path)
+                self.store.start()
+                self.poll_store(self.store)
                 return
-                
-            # Récupérer les noms des keypoints si disponibles
-            for category in self.json_data.get('categories', []):
-                if 'keypoints' in category:
-                    self.keypoint_names = category['keypoints']
-                    break
+            else:
+                self.store = AnnotationStore.load(json_path)
+                if json_size >= self.index_threshold_bytes:
+                    # Index absent ou périmé: reconstruit après l'affichage, pour la prochaine ouverture
+                    sidecar_path = json_path
+            self.store.compact_output = self.compact_json
+            self.keypoint_names = self.store.keypoint_names
+            # Miniatures demandées seulement une fois la première image affichée
+            self.filmstrip.set_dataset(0, self.image_path)
+            
+            if start is not None:
+                self.pending_start = None
+                index = self.find_start_image(start)
+                if index is None:
+                    messagebox.showwarning("Attention", f"Image de départ introuvable: {start}")
+                self.current_image_index = index or 0
                     
-            # Initialiser à la première image
-            self.current_image_index = 0
+            # Initialiser à l'image de départ
             self.update_image_info()
             self.load_current_image()
+            self.root.after_idle(self.start_deferred_tasks, self.store, sidecar_path)
             
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
         except Exception as e:
             messagebox.showerror("Erreur", f"Impossible de charger le fichier JSON: {str(e)}")
     
+    def poll_store(self, store):
+        """Intègre l'indexation en arrière-plan d'un gros fichier d'annotations"""
+        if store is not self.store:
+            # Un autre dataset a été chargé entre-temps
+            return
+        
+        was_empty = len(store) == 0
+        store.poll()
+        self.keypoint_names = store.keypoint_names
+        
+        if store.error is not None:
+            self.store = None
+            self.update_image_info()
+            messagebox.showerror("Erreur", f"Impossible de charger le fichier JSON: {str(store.error)}")
+            return
+        
+        self.update_image_info()
+        self.filmstrip.set_count(len(store))
+        if self.pending_start is not None:
+            # Image de départ: affichée dès qu'elle est indexée
+            index = self.find_start_image(self.pending_start)
+            if index is not None or store.complete:
+                if index is None:
+                    messagebox.showwarning("Attention", f"Image de départ introuvable: {self.pending_start}")
+                self.pending_start = None
+                self.current_image_index = index or 0
+                self.update_image_info()
+                if len(store):
+                    self.load_current_image()
+        elif was_empty and len(store):
+            # Afficher la première image sans attendre la fin de l'indexation
+            self.load_current_image()
+        
+        if store.complete:
+            if self.save_status_label.cget("text") == self.INDEXING_STATUS:
+                self.save_status_label.config(text="")
+            # Les annotations de l'image affichée sont maintenant toutes indexées
+            if len(store):
+                self.load_keypoints(store.image(self.current_image_index)['id'])
+            self.build_filter_index(store)
+        else:
+            self.root.after(self.STORE_POLL_MS, self.poll_store, store)
+    
+    def open_dataset_when_shown(self, dataset_path, start=None):
+        """Ouvre le dataset dès que le canvas a sa taille réelle (vue initiale et décodage à la bonne échelle)"""
+        if self.canvas.winfo_width() > 1:
+            self.open_dataset(dataset_path, start)
+        else:
+            # Fenêtre pas encore affichée: le canvas n'a que sa taille demandée
+            self.root.after(self.FRAME_MS, self.open_dataset_when_shown, dataset_path, start)
+    
+    def find_start_image(self, start):
+        """Position de l'image de départ: numéro à partir de 1 ou nom de fichier (None si pas encore trouvée)"""
+        if start.isdigit():
+            index = int(start) - 1
+            return index if 0 <= index < len(self.store) else None
+        
+        # Recherche reprise là où elle s'était arrêtée (indexation en flux)
+        count = len(self.store)
+        index = self.store.find_file_name(start, self.start_scanned)
+        if index is None:
+            self.start_scanned = count
+        return index
+    
+    def start_deferred_tasks(self, store, sidecar_path=None):
+        """Lancé une fois la première image affichée: miniatures, index des filtres et index binaire"""
+        if store is not self.store:
+            return
+        self.filmstrip.set_count(len(store))
+        self.filmstrip.set_current(self.current_image_index)
+        if sidecar_path:
+            threading.Thread(target=SidecarIndexBuilder.build, args=(sidecar_path,),
+                             name="coco-sidecar", daemon=True).start()
+        self.build_filter_index(store)
+    
+    def report_startup(self):
+        """Affiche le temps écoulé entre le lancement et l'affichage de la première image"""
+        elapsed = (time.perf_counter() - STARTED_AT) * 1000
+        exceeded = f" (objectif {self.startup_target_ms:.0f} ms dépassé)" if elapsed > self.startup_target_ms else ""
+        print(f"Première image affichée en {elapsed:.0f} ms{exceeded}")
+    
     def update_image_info(self):
         """Met à jour l'affichage des informations sur l'image courante"""
-        if self.json_data:
-            total_images = len(self.json_data['images'])
-            self.image_info_label.config(text=f"Image: {self.current_image_index + 1}/{total_images}")
+        if self.store:
+            total_images = len(self.store)
+            loading = "" if self.store.complete else " (chargement...)"
+            self.image_info_label.config(text=f"Image: {self.current_image_index + 1}/{total_images}{loading}")
             
             # Mettre à jour le nom du fichier
-            if self.current_image_index < len(self.json_data['images']):
-                filename = self.json_data['images'][self.current_image_index].get('file_name', '')
+            if self.current_image_index < total_images:
+                filename = self.store.image(self.current_image_index).get('file_name', '')
                 self.filename_label.config(text=f"Fichier: {filename}")
         else:
             self.image_info_label.config(text="Image: 0/0")
             self.filename_label.config(text="Fichier: ")
+        
+        # Problèmes signalés par le rapport de validation pour cette image
+        self.issues_label.config(text="\n".join(self.report_issues.get(self.current_image_index, [])))
     
+    @profiled("image_switch")
     def load_current_image(self):
         """Charge l'image courante et ses keypoints"""
-        if not self.json_data:
+        if not self.store:
             return
             
         # Vérifier les limites de l'index
         if self.current_image_index < 0:
             self.current_image_index = 0
-        elif self.current_image_index >= len(self.json_data['images']):
-            self.current_image_index = len(self.json_data['images']) - 1
+        elif self.current_image_index >= len(self.store):
+            self.current_image_index = len(self.store) - 1
             
         # Récupérer les informations de l'image
-        image_info = self.json_data['images'][self.current_image_index]
+        image_info = self.store.image(self.current_image_index)
         image_id = image_info['id']
         image_filename = image_info.get('file_name') or image_info.get('filename')
         
@@ -215,11 +3050,17 @@ class CocoAnnotationTool:
         # Charger l'image
         try:
             image_path = os.path.join(self.dataset_path, image_filename)
-            self.original_image = Image.open(image_path)
+            pyramid = self.pyramid_cache.get(image_path) or self.prefetcher.take(image_path)
+            if pyramid is None:
+                # Ne décoder que la résolution nécessaire à la vue initiale
+                pyramid = decode_image(image_path, self.profiler, self.initial_zoom(self.current_image_index))
+            self.pyramid_cache.pin(image_path)
+            self.pyramid_cache.put(image_path, pyramid)
+            self.renderer.set_source(pyramid)
             
             # Si les dimensions ne sont pas dans le JSON, les récupérer de l'image
             if self.image_width == 0 or self.image_height == 0:
-                self.image_width, self.image_height = self.original_image.size
+                self.image_width, self.image_height = pyramid.size
                 
             self.reset_view(update_image=False)
             self.update_display()
@@ -227,78 +3068,134 @@ class CocoAnnotationTool:
             # Charger les keypoints
             self.load_keypoints(image_id)
             
+            self.filmstrip.set_current(self.current_image_index)
+            
+            # Préparer les images voisines pendant que l'utilisateur annote
+            self.prefetcher.schedule(self.current_image_index, len(self.store), self.image_path, self.initial_zoom)
+            
+            if self.startup_target_ms is not None and not self.startup_reported:
+                self.startup_reported = True
+                # Exécuté une fois traités les dessins en attente, donc après l'affichage
+                self.root.after_idle(self.report_startup)
+            
         except Exception as e:
             messagebox.showerror("Erreur", f"Impossible de charger l'image: {str(e)}")
     
+    def fit_zoom(self, width, height):
+        """Zoom auquel une image de cette taille tient entièrement dans le canvas (au plus 1.0)"""
+        if not width or not height:
+            return 1.0
+        view_width, view_height = self.renderer.viewport_size()
+        return max(0.1, min(1.0, view_width / width, view_height / height))
+    
+    def initial_zoom(self, index):
+        """Zoom de la vue initiale d'une image, d'après ses dimensions dans le JSON"""
+        image_info = self.store.image(index)
+        return self.fit_zoom(image_info.get('width', 0), image_info.get('height', 0))
+    
+    def image_path(self, index):
+        """Retourne le chemin du fichier de l'image d'index donné"""
+        image_info = self.store.image(index)
+        image_filename = image_info.get('file_name') or image_info.get('filename')
+        if not image_filename:
+            return None
+        return os.path.join(self.dataset_path, image_filename)
+    
+    @profiled("load_keypoints")
     def load_keypoints(self, image_id):
-        """Charge les keypoints pour l'image courante"""
+        """Charge les keypoints de toutes les personnes annotées sur l'image courante"""
         self.clear_circles()
-        self.keypoints = []
+        self.people = {}
+        self.dirty = False
+        self.spatial_index.clear()
+        self.drag_data["item"] = None
+        self.pending_drag = None
         
         # Réinitialiser l'affichage des coordonnées
         self.clear_keypoint_info()
         
-        # Trouver l'annotation correspondant à l'image courante
-        for annotation in self.json_data['annotations']:
-            if annotation.get('image_id') == image_id and 'keypoints' in annotation:
-                keypoints_data = annotation['keypoints']
-                
-                # Les keypoints COCO sont stockés au format [x1, y1, v1, x2, y2, v2, ...]
-                # où v est un flag de visibilité (0: non marqué, 1: marqué mais non visible, 2: visible)
-                for i in range(0, len(keypoints_data), 3):
-                    if i + 1 < len(keypoints_data):  # Vérifier qu'il y a au moins x et y
-                        x, y = keypoints_data[i], keypoints_data[i + 1]
-                        visibility = keypoints_data[i + 2] if i + 2 < len(keypoints_data) else 2
-                        
-                        # Stocker les coordonnées originales (non transformées)
-                        self.keypoints.append((x, y, visibility, i // 3))
-                
-                # Dessiner les cercles pour les keypoints
-                self.draw_circles()
-                break
+        # Chaque annotation avec des keypoints forme un groupe distinct
+        points = {}
+        for position, annotation in enumerate(self.store.annotations_for_image(image_id)):
+            if 'keypoints' not in annotation:
+                continue
+            # Les annotations sans id restent identifiables par leur position
+            ann_id = annotation.get('id', -(position + 1))
+            self.people[ann_id] = annotation
+            points[ann_id] = parse_keypoints(annotation['keypoints'])
+        
+        # Stocker les coordonnées originales (non transformées), limitées aux dimensions de l'image
+        self.keypoints = ImageKeypoints(points)
+        self.keypoints.clamp(self.image_width, self.image_height)
+        for key, (x, y, _) in self.keypoints.items():
+            self.spatial_index.insert(key, x, y)
+        
+        # Dessiner les cercles pour les keypoints
+        self.draw_circles()
     
+    @profiled("draw_circles")
     def draw_circles(self):
-        """Dessine les cercles pour les keypoints"""
+        """Crée les cercles des keypoints (une seule fois par image)"""
         self.clear_circles()
         
-        for x, y, visibility, idx in self.keypoints:
-            # Vérifier que le point est dans les limites de l'image
-            if not (0 <= x <= self.image_width and 0 <= y <= self.image_height):
-                # Limiter les coordonnées aux dimensions de l'image
-                x = max(0, min(x, self.image_width))
-                y = max(0, min(y, self.image_height))
-                
-                # Mettre à jour les keypoints avec les coordonnées limitées
-                for i, (_, _, v, idx_) in enumerate(self.keypoints):
-                    if idx_ == idx:
-                        self.keypoints[i] = (x, y, v, idx_)
-                        break
-            
-            # Appliquer la transformation (zoom et pan)
-            transformed_x, transformed_y = self.transform_point(x, y)
-            
+        # Rang de chaque personne, pour la couleur de son groupe
+        groups = {ann_id: i for i, ann_id in enumerate(self.people)}
+        
+        # Arêtes du squelette, sous les cercles, entre keypoints marqués de la même personne
+        for ann_id, annotation in self.people.items():
+            color = PERSON_COLORS[groups[ann_id] % len(PERSON_COLORS)]
+            for a, b in self.store.skeleton_for(annotation.get('category_id')):
+                start, end = (ann_id, a), (ann_id, b)
+                if start not in self.keypoints or end not in self.keypoints:
+                    continue
+                if not self.keypoints[start][2] or not self.keypoints[end][2]:
+                    continue
+                line = self.canvas.create_line(0, 0, 0, 0, fill=color, width=2,
+                                               tags=("scene", "skeleton", f"ann_{ann_id}"))
+                self.skeleton_lines.append((line, start, end))
+                # Au glisser, seules les arêtes du point déplacé sont mises à jour
+                self.edges_of.setdefault(start, []).append((line, end))
+                self.edges_of.setdefault(end, []).append((line, start))
+        
+        for (ann_id, idx), (x, y, visibility) in self.keypoints.items():
             # Couleur basée sur la visibilité (rouge: non visible, vert: visible)
             color = "green" if visibility == 2 else "yellow" if visibility == 1 else "red"
+            # Contour propre à chaque personne pour distinguer les groupes
+            outline = PERSON_COLORS[groups[ann_id] % len(PERSON_COLORS)]
             
-            # Dessiner le cercle
+            # Créer le cercle et le nom du keypoint (positionnés par position_circles)
             circle = self.canvas.create_oval(
-                transformed_x - self.circle_radius, 
-                transformed_y - self.circle_radius,
-                transformed_x + self.circle_radius, 
-                transformed_y + self.circle_radius,
-                fill=color, outline="black", tags=f"keypoint_{idx}"
+                0, 0, 0, 0,
+                fill=color, outline=outline, width=2,
+                tags=("scene", "keypoint", f"ann_{ann_id}", f"kp_{ann_id}_{idx}")
             )
-            
-            # Ajouter le cercle à la liste
-            self.circles.append((circle, idx))
-            
-            # Ajouter le nom du keypoint au lieu de l'index
-            keypoint_name = self.get_keypoint_name(idx)
-            self.canvas.create_text(
-                transformed_x, transformed_y - self.circle_radius - 5,
-                text=keypoint_name, font=("Arial", 8),
-                fill="white", tags=f"keypoint_text_{idx}"
+            text = self.canvas.create_text(
+                0, 0,
+                text=self.get_keypoint_name(idx), font=("Arial", 8),
+                fill="white", tags=("scene", "keypoint_text", f"ann_{ann_id}", f"kp_text_{ann_id}_{idx}")
             )
+            
+            self.circles[(ann_id, idx)] = (circle, text)
+        
+        self.position_circles()
+    
+    @profiled("position_circles")
+    def position_circles(self):
+        """Repositionne les cercles existants selon le zoom, le pan et le rayon actuels"""
+        r = self.circle_radius
+        coords = self.canvas.coords
+        # Tous les points transformés d'un coup: boîtes des cercles et position des noms
+        canvas = self.keypoints.canvas_coords(self.zoom_factor, self.pan_x, self.pan_y)
+        boxes = np.concatenate((canvas - r, canvas + r), axis=-1).tolist()
+        labels = (canvas - (0, r + 5)).tolist()
+        person = self.keypoints.person
+        for (ann_id, idx), (circle, text) in self.circles.items():
+            coords(circle, *boxes[person[ann_id]][idx])
+            coords(text, *labels[person[ann_id]][idx])
+        if self.skeleton_lines:
+            centers = canvas.tolist()
+            for line, (ann_id, a), (_, b) in self.skeleton_lines:
+                coords(line, *centers[person[ann_id]][a], *centers[person[ann_id]][b])
     
     def get_keypoint_name(self, idx):
         """Retourne le nom du keypoint à partir de son index"""
@@ -309,41 +3206,36 @@ class CocoAnnotationTool:
     
     def clear_circles(self):
         """Supprime tous les cercles du canvas"""
-        for circle, _ in self.circles:
-            self.canvas.delete(circle)
-        self.circles = []
-        
-        # Supprimer également les textes
-        for idx in range(len(self.keypoint_names) if self.keypoint_names else 20):
-            self.canvas.delete(f"keypoint_text_{idx}")
+        self.canvas.delete("keypoint")
+        self.canvas.delete("keypoint_text")
+        self.canvas.delete("skeleton")
+        self.circles = {}
+        self.skeleton_lines = []
+        self.edges_of = {}
     
-    def update_display(self):
+    def update_display(self, preview=False):
         """Met à jour l'affichage de l'image avec le zoom et le pan actuels"""
-        if not hasattr(self, 'original_image'):
+        if self.renderer.pyramid is None:
             return
-            
-        # Redimensionner l'image selon le facteur de zoom
-        new_width = int(self.original_image.width * self.zoom_factor)
-        new_height = int(self.original_image.height * self.zoom_factor)
-        
-        # Créer une nouvelle image redimensionnée
-        self.display_image = self.original_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        self.photo_image = ImageTk.PhotoImage(self.display_image)
-        
-        # Mettre à jour le canvas
-        self.canvas.delete("image")
-        self.canvas.create_image(
-            self.pan_x, self.pan_y, 
-            anchor=tk.NW, 
-            image=self.photo_image, 
-            tags="image"
-        )
         
-        # Mettre à jour la taille du canvas
-        self.canvas.config(scrollregion=self.canvas.bbox(tk.ALL))
+        # L'affichage reflète maintenant tout le zoom et le pan en attente
+        self.pending_render = False
+        self.pending_pan = [0, 0]
+        if self.settle_id is not None:
+            self.root.after_cancel(self.settle_id)
+            self.settle_id = None
+            
+        # Ne rééchantillonner que la zone visible du canvas (plus une marge)
+        with self.profiler.measure("render"):
+            if preview:
+                # Aperçu rapide pendant le mouvement, rendu de qualité une fois au repos
+                self.renderer.render(self.zoom_factor, self.pan_x, self.pan_y, Image.Resampling.NEAREST)
+                self.settle_id = self.root.after(self.SETTLE_MS, self.refine_display)
+            else:
+                self.renderer.render(self.zoom_factor, self.pan_x, self.pan_y)
         
-        # Redessiner les cercles
-        self.draw_circles()
+        # Repositionner les cercles sans les recréer
+        self.position_circles()
     
     def transform_point(self, x, y):
         """Transforme les coordonnées d'un point selon le zoom et le pan actuels"""
@@ -360,10 +3252,12 @@ class CocoAnnotationTool:
         self.y_coord_label.config(text="-")
         self.visibility_label.config(text="-")
     
-    def update_keypoint_info(self, idx, x, y, visibility):
+    def update_keypoint_info(self, idx, x, y, visibility, ann_id=None):
         """Met à jour l'affichage des informations du keypoint"""
-        # Mettre à jour le nom du keypoint
+        # Mettre à jour le nom du keypoint (et la personne si l'image en compte plusieurs)
         keypoint_name = self.get_keypoint_name(idx)
+        if ann_id is not None and len(self.people) > 1:
+            keypoint_name = f"{keypoint_name} (personne {list(self.people).index(ann_id) + 1})"
         self.keypoint_label.config(text=f"Keypoint: {keypoint_name}")
             
         # Mettre à jour les coordonnées
@@ -377,81 +3271,60 @@ class CocoAnnotationTool:
     def on_mouse_press(self, event):
         """Gère l'événement de clic de souris"""
         if self.mode == "edit":
-            # Mode édition: sélectionner et déplacer des points
-            closest = self.canvas.find_closest(event.x, event.y)
-            if closest and closest[0] != self.canvas.find_withtag("image")[0]:
+            if self.store and not self.store.complete:
+                # Indexation en cours: la modification ne pourrait pas être sauvegardée
+                self.drag_data["item"] = None
+                self.save_status_label.config(text=self.INDEXING_STATUS)
+                return
+            # Mode édition: chercher le point le plus proche dans l'index spatial
+            x, y = self.inverse_transform_point(event.x, event.y)
+            radius = (self.circle_radius + 2) / self.zoom_factor
+            key = self.spatial_index.nearest(x, y, radius)
+            self.drag_data["item"] = key
+            if key is not None:
                 # Un point a été sélectionné
-                self.drag_data["item"] = closest[0]
                 self.drag_data["x"] = event.x
                 self.drag_data["y"] = event.y
                 
                 # Afficher les informations du keypoint sélectionné
-                for circle, idx in self.circles:
-                    if circle == closest[0]:
-                        for kp_x, kp_y, kp_v, kp_idx in self.keypoints:
-                            if kp_idx == idx:
-                                self.update_keypoint_info(idx, kp_x, kp_y, kp_v)
-                                break
-                        break
+                kp_x, kp_y, kp_v = self.keypoints[key]
+                self.update_keypoint_info(key[1], kp_x, kp_y, kp_v, key[0])
         elif self.mode == "grab":
             # Mode déplacement d'image
             self.drag_data["x"] = event.x
             self.drag_data["y"] = event.y
     
+    @profiled("mouse_drag")
     def on_mouse_drag(self, event):
-        """Gère l'événement de glisser-déposer"""
-        if self.mode == "edit" and self.drag_data["item"]:
+        """Gère l'événement de glisser-déposer (le rendu est différé à la prochaine frame)"""
+        if self.mode == "edit" and self.drag_data["item"] is not None:
+            key = self.drag_data["item"]
+            
             # Déplacer le point sélectionné
             dx = event.x - self.drag_data["x"]
             dy = event.y - self.drag_data["y"]
             
-            self.canvas.move(self.drag_data["item"], dx, dy)
-            
-            # Déplacer également le texte associé si présent
-            for _, idx in self.circles:
-                if f"keypoint_text_{idx}" in self.canvas.gettags(self.drag_data["item"]) or \
-                   f"keypoint_{idx}" in self.canvas.gettags(self.drag_data["item"]):
-                    self.canvas.move(f"keypoint_text_{idx}", dx, dy)
-                    break
-            
             # Mettre à jour les données de glisser-déposer
             self.drag_data["x"] = event.x
             self.drag_data["y"] = event.y
             
-            # Mettre à jour les coordonnées du keypoint
-            for i, (circle, idx) in enumerate(self.circles):
-                if circle == self.drag_data["item"]:
-                    # Récupérer les nouvelles coordonnées
-                    x1, y1, x2, y2 = self.canvas.coords(circle)
-                    center_x = (x1 + x2) / 2
-                    center_y = (y1 + y2) / 2
-                    
-                    # Convertir en coordonnées d'image originale
-                    orig_x, orig_y = self.inverse_transform_point(center_x, center_y)
-                    
-                    # Limiter les coordonnées aux dimensions de l'image
-                    orig_x = max(0, min(orig_x, self.image_width))
-                    orig_y = max(0, min(orig_y, self.image_height))
-                    
-                    # Mettre à jour les keypoints
-                    visibility = self.keypoints[i][2]
-                    self.keypoints[i] = (orig_x, orig_y, visibility, idx)
-                    
-                    # Mettre à jour l'affichage des coordonnées
-                    self.update_keypoint_info(idx, orig_x, orig_y, visibility)
-                    
-                    # Si les coordonnées ont été limitées, mettre à jour la position du cercle
-                    new_x, new_y = self.transform_point(orig_x, orig_y)
-                    center_x_canvas = (x1 + x2) / 2
-                    center_y_canvas = (y1 + y2) / 2
-                    
-                    if new_x != center_x_canvas or new_y != center_y_canvas:
-                        dx_correction = new_x - center_x_canvas
-                        dy_correction = new_y - center_y_canvas
-                        self.canvas.move(circle, dx_correction, dy_correction)
-                        self.canvas.move(f"keypoint_text_{idx}", dx_correction, dy_correction)
-                    
-                    break
+            # Nouvelle position, convertie en coordonnées d'image originale
+            x, y, visibility = self.keypoints[key]
+            canvas_x, canvas_y = self.transform_point(x, y)
+            orig_x, orig_y = self.inverse_transform_point(canvas_x + dx, canvas_y + dy)
+            
+            # Limiter les coordonnées aux dimensions de l'image
+            orig_x = max(0, min(orig_x, self.image_width))
+            orig_y = max(0, min(orig_y, self.image_height))
+            
+            # Mettre à jour les keypoints et l'index spatial
+            self.keypoints[key] = (orig_x, orig_y, visibility)
+            self.spatial_index.move(key, orig_x, orig_y)
+            self.mark_dirty()
+            
+            # Le cercle et les étiquettes seront mis à jour à la prochaine frame
+            self.pending_drag = key
+            self.schedule_frame()
                     
         elif self.mode == "grab":
             # Déplacer l'image
@@ -465,19 +3338,102 @@ class CocoAnnotationTool:
             self.drag_data["x"] = event.x
             self.drag_data["y"] = event.y
             
-            # Mettre à jour l'affichage
-            self.update_display()
+            # Cumuler les déplacements jusqu'à la prochaine frame
+            self.pending_pan[0] += dx
+            self.pending_pan[1] += dy
+            self.schedule_frame()
+    
+    def schedule_frame(self):
+        """Programme le traitement des entrées en attente (au plus une fois par frame)"""
+        if self.frame_id is None:
+            self.frame_id = self.root.after(self.FRAME_MS, self.process_input)
+    
+    def flush_input(self):
+        """Traite immédiatement les entrées en attente"""
+        if self.frame_id is not None:
+            self.root.after_cancel(self.frame_id)
+            self.process_input()
+    
+    @profiled("input_frame")
+    def process_input(self):
+        """Applique en une fois les déplacements, zooms et glissers cumulés depuis la dernière frame"""
+        self.frame_id = None
+        
+        redraw = self.pending_radius is not None
+        if redraw:
+            self.circle_radius = self.pending_radius
+            self.pending_radius = None
+        
+        if self.pending_render:
+            # Le zoom a changé: aperçu rapide, la version LANCZOS suivra au repos
+            self.update_display(preview=True)
+            redraw = False
+        elif self.pending_pan != [0, 0]:
+            dx, dy = self.pending_pan
+            self.pending_pan = [0, 0]
+            # Tant que la vue reste dans la marge déjà rendue, un simple déplacement suffit
+            if self.renderer.pan(dx, dy):
+                self.canvas.move("scene", dx, dy)
+            else:
+                self.update_display(preview=True)
+                redraw = False
+        
+        if redraw:
+            self.position_circles()
+        
+        if self.pending_drag is not None:
+            key = self.pending_drag
+            self.pending_drag = None
+            if key in self.circles:
+                self.place_keypoint(key)
+                x, y, visibility = self.keypoints[key]
+                self.update_keypoint_info(key[1], x, y, visibility, key[0])
+    
+    def refine_display(self):
+        """Remplace l'aperçu rapide par un rendu de qualité une fois les entrées au repos"""
+        self.settle_id = None
+        with self.profiler.measure("render"):
+            self.renderer.render(self.zoom_factor, self.pan_x, self.pan_y)
+    
+    def place_keypoint(self, key):
+        """Repositionne le cercle et le nom d'un keypoint"""
+        x, y, _ = self.keypoints[key]
+        new_x, new_y = self.transform_point(x, y)
+        circle, text = self.circles[key]
+        r = self.circle_radius
+        self.canvas.coords(circle, new_x - r, new_y - r, new_x + r, new_y + r)
+        self.canvas.coords(text, new_x, new_y - r - 5)
+        # Arêtes touchant ce keypoint: coût indépendant du nombre de personnes
+        for line, other in self.edges_of.get(key, ()):
+            other_x, other_y, _ = self.keypoints[other]
+            self.canvas.coords(line, new_x, new_y, *self.transform_point(other_x, other_y))
+    
+    def on_canvas_resize(self, event):
+        """Met à jour l'affichage quand la taille du canvas change"""
+        self.update_display()
     
     def on_mouse_wheel_up(self, event):
         """Gère l'événement de zoom avant (molette vers le haut)"""
-        self.zoom(1.1, event.x, event.y)
+        self.apply_zoom(1.1, event.x, event.y)
+        self.pending_render = True
+        self.schedule_frame()
         
     def on_mouse_wheel_down(self, event):
         """Gère l'événement de zoom arrière (molette vers le bas)"""
-        self.zoom(0.9, event.x, event.y)
+        self.apply_zoom(0.9, event.x, event.y)
+        self.pending_render = True
+        self.schedule_frame()
     
+    @profiled("zoom")
     def zoom(self, factor, x=None, y=None):
         """Ajuste le zoom et met à jour l'affichage"""
+        self.apply_zoom(factor, x, y)
+        
+        # Mettre à jour l'affichage
+        self.update_display()
+    
+    def apply_zoom(self, factor, x=None, y=None):
+        """Ajuste le facteur de zoom et le pan, sans redessiner"""
         old_zoom = self.zoom_factor
         self.zoom_factor *= factor
         
@@ -490,22 +3446,19 @@ class CocoAnnotationTool:
             scale_factor = self.zoom_factor / old_zoom
             self.pan_x = x - (x - self.pan_x) * scale_factor
             self.pan_y = y - (y - self.pan_y) * scale_factor
-        
-        # Mettre à jour l'affichage
-        self.update_display()
     
     def reset_view(self, update_image=True):
-        """Réinitialise le zoom et le pan"""
-        self.zoom_factor = 1.0
+        """Réinitialise le zoom (image entière visible) et le pan"""
+        self.zoom_factor = self.fit_zoom(self.image_width, self.image_height)
         self.pan_x = 0
         self.pan_y = 0
         if update_image:
             self.update_display()
     
     def update_circle_radius(self, value):
-        """Met à jour le rayon des cercles"""
-        self.circle_radius = float(value)
-        self.draw_circles()
+        """Met à jour le rayon des cercles (à la prochaine frame)"""
+        self.pending_radius = float(value)
+        self.schedule_frame()
     
     def change_mode(self):
         """Change le mode d'interaction (édition ou déplacement)"""
@@ -517,58 +3470,383 @@ class CocoAnnotationTool:
         else:
             self.canvas.config(cursor="arrow")
     
+    def goto_image(self, index):
+        """Passe directement à l'image d'index donné"""
+        if self.store and 0 <= index < len(self.store) and index != self.current_image_index:
+            self.save_if_dirty()
+            self.current_image_index = index
+            self.update_image_info()
+            self.load_current_image()
+    
+    def load_report(self):
+        """Charge un rapport de validation (app.py --validate) pour parcourir les images signalées"""
+        if not self.store:
+            messagebox.showwarning("Attention", "Aucun dataset chargé.")
+            return
+        
+        report_path = filedialog.askopenfilename(title="Sélectionner le rapport de validation",
+                                                 initialdir=self.dataset_path,
+                                                 filetypes=[("Rapport JSON", "*.json")])
+        if not report_path:
+            return
+        
+        try:
+            with open(report_path, 'r') as f:
+                report = json.load(f)
+            issues = {}
+            for issue in report['issues']:
+                if issue.get('index') is not None:
+                    issues.setdefault(issue['index'], []).append(issue['message'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            messagebox.showerror("Erreur", f"Impossible de charger le rapport: {str(e)}")
+            return
+        
+        if self.store.complete and report.get('images') != len(self.store):
+            messagebox.showwarning("Attention", "Le rapport ne correspond pas au dataset chargé (nombre d'images différent).")
+        self.report_issues = issues
+        self.flagged = sorted(issues)
+        self.update_image_info()
+        messagebox.showinfo("Rapport", f"{len(self.flagged)} image(s) signalée(s).")
+    
+    def next_flagged(self):
+        """Passe à la prochaine image signalée par le rapport de validation"""
+        position = bisect.bisect_right(self.flagged, self.current_image_index)
+        if position < len(self.flagged):
+            self.goto_image(self.flagged[position])
+    
+    def previous_flagged(self):
+        """Revient à la précédente image signalée par le rapport de validation"""
+        position = bisect.bisect_left(self.flagged, self.current_image_index)
+        if position > 0:
+            self.goto_image(self.flagged[position - 1])
+    
     def next_image(self):
-        """Passe à l'image suivante"""
-        if self.json_data and self.current_image_index < len(self.json_data['images']) - 1:
+        """Passe à l'image suivante (parmi les images filtrées si un filtre est actif)"""
+        if self.filter_index is not None and self.filter_index.active:
+            self.save_if_dirty()
+            target = self.filter_index.next(self.current_image_index)
+            if target is not None:
+                self.goto_image(target)
+            return
+        if self.store and self.current_image_index < len(self.store) - 1:
+            self.save_if_dirty()
             self.current_image_index += 1
             self.update_image_info()
             self.load_current_image()
     
     def previous_image(self):
-        """Passe à l'image précédente"""
-        if self.json_data and self.current_image_index > 0:
+        """Passe à l'image précédente (parmi les images filtrées si un filtre est actif)"""
+        if self.filter_index is not None and self.filter_index.active:
+            self.save_if_dirty()
+            target = self.filter_index.previous(self.current_image_index)
+            if target is not None:
+                self.goto_image(target)
+            return
+        if self.store and self.current_image_index > 0:
+            self.save_if_dirty()
             self.current_image_index -= 1
             self.update_image_info()
             self.load_current_image()
     
-    def save_annotations(self):
-        """Sauvegarde les annotations dans le fichier JSON"""
-        if not self.json_data:
-            messagebox.showwarning("Attention", "Aucun dataset chargé.")
+    @profiled("save")
+    def save_annotations(self, auto=False):
+        """Sauvegarde les keypoints de l'image courante (écriture sur disque en arrière-plan)"""
+        if not self.store:
+            if not auto:
+                messagebox.showwarning("Attention", "Aucun dataset chargé.")
+            return
+        
+        if not self.store.complete:
+            if not auto:
+                messagebox.showwarning("Attention", "Indexation des annotations en cours, réessayez dans un instant.")
             return
             
         try:
             # Récupérer l'ID de l'image courante
-            image_id = self.json_data['images'][self.current_image_index]['id']
-            
-            # Trouver l'annotation correspondante
-            for annotation in self.json_data['annotations']:
-                if annotation.get('image_id') == image_id:
-                    # Mettre à jour les keypoints
-                    keypoints_flat = []
-                    for x, y, v, _ in self.keypoints:
-                        keypoints_flat.extend([round(x), round(y), int(v)])
-                    
-                    annotation['keypoints'] = keypoints_flat
-                    break
-            else:
-                messagebox.showwarning("Attention", "Aucune annotation trouvée pour cette image.")
-                return
+            image_id = self.store.image(self.current_image_index)['id']
             
-            # Sauvegarder le fichier JSON
-            json_file = next(f for f in os.listdir(self.dataset_path) 
-                            if f.endswith('.json') and 'annotations' in f.lower())
+            if not self.people:
+                if not auto:
+                    messagebox.showwarning("Attention", "Aucune annotation trouvée pour cette image.")
+                return
             
-            with open(os.path.join(self.dataset_path, json_file), 'w') as f:
-                json.dump(self.json_data, f, indent=2)
+            # Instantané des keypoints de chaque personne (listes neuves, indépendantes de l'affichage)
+            changes = []
+            for ann_id, annotation in self.people.items():
+                keypoints_flat = self.keypoints.to_coco(ann_id)
                 
-            messagebox.showinfo("Succès", "Annotations sauvegardées avec succès.")
+                if 'id' in annotation:
+                    changes.append({"id": annotation['id'], "keypoints": keypoints_flat})
+                else:
+                    annotation['keypoints'] = keypoints_flat
+            
+            # La modification est appliquée en mémoire tout de suite, écrite par le thread de sauvegarde
+            entry = {"image_id": image_id, "annotations": changes}
+            self.store.apply_edit(entry)
+            self.dirty = False
+            if self.filter_index is not None:
+                self.filter_index.update(self.current_image_index)
+                self.update_filter_label()
+            if len(changes) == len(self.people):
+                # Seule la modification est écrite, dans le journal
+                self.saver.save(self.store, image_id, entry)
+                if self.store.journal.count >= self.COMPACT_EVERY:
+                    self.request_compaction()
+            else:
+                # Annotation sans id: impossible à journaliser, réécriture complète
+                self.request_compaction()
+            self.save_status_label.config(text="Sauvegarde en cours...")
             
         except Exception as e:
             messagebox.showerror("Erreur", f"Impossible de sauvegarder les annotations: {str(e)}")
+    
+    def mark_dirty(self):
+        """Signale des modifications non encore sauvegardées sur l'image courante"""
+        if not self.dirty:
+            self.dirty = True
+            self.save_status_label.config(text="Modifications non sauvegardées")
+    
+    def save_if_dirty(self):
+        """Sauvegarde l'image courante avant de la quitter si elle a été modifiée"""
+        if self.dirty:
+            self.save_annotations(auto=True)
+    
+    def autosave(self):
+        """Sauvegarde régulièrement les modifications en attente"""
+        self.save_if_dirty()
+        self.root.after(self.AUTOSAVE_MS, self.autosave)
+    
+    def request_compaction(self):
+        """Demande une compaction en arrière-plan (une seule à la fois, les demandes suivantes sont regroupées)"""
+        if self.store and not self.saver.compact(self.store):
+            # Une compaction est déjà en cours: en refaire une seule à sa fin
+            self.compaction_requested = True
+    
+    def poll_saves(self):
+        """Relève les écritures terminées par le thread de sauvegarde"""
+        self.handle_save_results(self.saver.poll())
+        self.root.after(self.SAVE_POLL_MS, self.poll_saves)
+    
+    def flush_saves(self):
+        """Attend la fin des écritures en arrière-plan (fermeture, benchmark)"""
+        self.handle_save_results(self.saver.drain())
+    
+    def handle_save_results(self, results):
+        """Met à jour l'indicateur de sauvegarde (non modal) d'après les écritures terminées"""
+        for kind, _, error in results:
+            if error is not None:
+                self.save_status_label.config(text="Échec de la sauvegarde")
+                messagebox.showerror("Erreur", f"Impossible de sauvegarder les annotations: {str(error)}")
+            elif not self.dirty:
+                done = "Sauvegardé et compacté" if kind == 'compact' else "Sauvegardé"
+                self.save_status_label.config(text=f"{done} à {time.strftime('%H:%M:%S')}")
+        
+        if self.compaction_requested and self.saver.compacting is None:
+            self.compaction_requested = False
+            self.request_compaction()
+    
+    def build_filter_index(self, store):
+        """Construit l'index des filtres d'un dataset chargé et réapplique le filtre saisi"""
+        if store is not self.store:
+            return
+        self.filter_index = ImageFilterIndex.from_store(store)
+        if self.filter_index is not None:
+            try:
+                self.filter_index.set_query(self.filter_var.get())
+            except ValueError:
+                pass
+        self.update_filter_label()
+    
+    def apply_filter(self, event=None):
+        """Restreint la navigation aux images qui vérifient la requête du filtre"""
+        if self.filter_index is None and self.store and self.store.complete:
+            self.build_filter_index(self.store)
+        if self.filter_index is None:
+            messagebox.showwarning("Attention", "Filtre indisponible (dataset non chargé ou en cours d'indexation).")
+            return
+        
+        try:
+            self.filter_index.set_query(self.filter_var.get())
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
+            return
+        self.update_filter_label()
+    
+    def update_filter_label(self):
+        """Affiche le nombre d'images retenues par le filtre"""
+        if self.filter_index is not None and self.filter_index.active:
+            self.filter_label.config(text=f"{len(self.filter_index.matches)} image(s) filtrée(s)")
+        else:
+            self.filter_label.config(text="")
+    
+    def show_statistics(self):
+        """Affiche, pour chaque keypoint, sa fréquence d'annotation et de visibilité sur le dataset"""
+        keypoint_store = self.store.keypoint_store() if self.store and self.store.complete else None
+        if keypoint_store is None:
+            messagebox.showwarning("Attention", "Statistiques indisponibles (dataset non chargé ou en cours d'indexation).")
+            return
+        
+        stats = keypoint_store.stats()
+        total = max(stats['annotations'], 1)
+        lines = [f"Annotations: {stats['annotations']} (complètes: {stats['complete']})", ""]
+        for idx, (labelled, visible, (x, y)) in enumerate(zip(stats['labelled'], stats['visible'], stats['mean'])):
+            lines.append(f"{self.get_keypoint_name(idx)}: annoté {100 * labelled / total:.1f} %, "
+                         f"visible {100 * visible / total:.1f} %, position moyenne ({x:.0f}, {y:.0f})")
+        messagebox.showinfo("Statistiques", "\n".join(lines))
+    
+    def export_yolo(self):
+        """Lance l'export des labels YOLO-pose en arrière-plan (seules les images modifiées sont réécrites)"""
+        if not self.store:
+            messagebox.showwarning("Attention", "Aucun dataset chargé.")
+            return
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showwarning("Attention", "Export YOLO déjà en cours.")
+            return
+        
+        # L'export relit les annotations sauvegardées (fichier et journal) avec ses propres index: depuis
+        # l'index binaire s'il est à jour, sinon en chargeant une seconde copie du dataset le temps de l'export
+        def run(dataset_path):
+            try:
+                self.export_results.put(export_yolo(dataset_path))
+            except Exception as e:
+                self.export_results.put(e)
+        
+        self.export_thread = threading.Thread(target=run, args=(self.dataset_path,), name="yolo-export", daemon=True)
+        self.export_thread.start()
+        self.root.after(self.STORE_POLL_MS, self.poll_export)
+    
+    def poll_export(self):
+        """Affiche le résultat de l'export YOLO une fois terminé"""
+        try:
+            result = self.export_results.get_nowait()
+        except queue.Empty:
+            self.root.after(self.STORE_POLL_MS, self.poll_export)
+            return
+        
+        if isinstance(result, Exception):
+            messagebox.showerror("Erreur", f"Impossible d'exporter les labels YOLO: {str(result)}")
+        else:
+            messagebox.showinfo("Export YOLO", f"{result['written']} fichier(s) écrit(s), {result['skipped']} inchangé(s), "
+                                               f"{result['failed']} en échec, dans {result['labels']}")
+    
+    def periodic_compact(self):
+        """Intègre régulièrement le journal au fichier d'annotations (en arrière-plan)"""
+        if self.store and self.store.journal.count:
+            self.request_compaction()
+        self.root.after(self.COMPACT_INTERVAL_MS, self.periodic_compact)
+    
+    def toggle_profiler(self, event=None):
+        """Affiche ou masque les temps des gestionnaires sur le canvas"""
+        self.profiler.enabled = not self.profiler.enabled
+        # Une seule boucle de rafraîchissement, même après plusieurs bascules rapprochées
+        if self.profiler_overlay_id is not None:
+            self.root.after_cancel(self.profiler_overlay_id)
+            self.profiler_overlay_id = None
+        if self.profiler.enabled:
+            self.update_profiler_overlay()
+        else:
+            self.canvas.delete("profiler_overlay")
+    
+    def update_profiler_overlay(self):
+        """Rafraîchit périodiquement l'affichage des p50/p95 glissants"""
+        self.profiler_overlay_id = None
+        self.canvas.delete("profiler_overlay")
+        if not self.profiler.enabled:
+            return
+        
+        lines = [f"{name:<16} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  (n={count})"
+                 for name, (p50, p95, count) in sorted(self.profiler.stats().items())]
+        text = self.canvas.create_text(
+            10, 10, anchor=tk.NW, text="\n".join(lines) or "Profiler actif (F12)",
+            font=("Courier", 9), fill="white", tags="profiler_overlay"
+        )
+        bbox = self.canvas.bbox(text)
+        if bbox:
+            x1, y1, x2, y2 = bbox
+            background = self.canvas.create_rectangle(x1 - 4, y1 - 4, x2 + 4, y2 + 4, fill="black",
+                                                      outline="", tags="profiler_overlay")
+            self.canvas.tag_lower(background, text)
+        self.canvas.tag_raise("profiler_overlay")
+        self.profiler_overlay_id = self.root.after(500, self.update_profiler_overlay)
+    
+    def on_close(self):
+        """Arrête les tâches de fond, compacte le journal puis ferme la fenêtre"""
+        self.prefetcher.shutdown()
+        self.filmstrip.shutdown()
+        # Terminer les sauvegardes en cours avant la compaction finale; celle-ci remplace
+        # une compaction demandée entre-temps, qui ne doit pas tourner en même temps
+        self.save_if_dirty()
+        self.compaction_requested = False
+        self.flush_saves()
+        try:
+            if self.store and self.store.journal.count:
+                with self.profiler.measure("compact"):
+                    self.store.compact()
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Impossible de compacter les annotations: {str(e)}")
+        # Après les dernières écritures, pour qu'elles figurent dans la trace
+        self.profiler.dump_trace()
+        self.root.destroy()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="COCO Annotation Tool pour YOLO Pose")
+    parser.add_argument("dataset", nargs="?", metavar="DOSSIER",
+                        help="dataset à ouvrir directement (sinon bouton \"Charger Dataset\")")
+    parser.add_argument("--start", metavar="IMAGE",
+                        help="image de départ: numéro (à partir de 1) ou nom de fichier")
+    parser.add_argument("--geometry", default="1200x800", metavar="LxH[+X+Y]",
+                        help="taille et position de la fenêtre (défaut: 1200x800)")
+    parser.add_argument("--cache-mb", type=int, default=512, metavar="Mo",
+                        help="mémoire des images décodées (défaut: 512 Mo)")
+    parser.add_argument("--prefetch", type=int, default=3, metavar="N",
+                        help="nombre d'images suivantes décodées à l'avance (défaut: 3)")
+    parser.add_argument("--thumbnail-dir", metavar="DOSSIER",
+                        help="cache des miniatures (défaut: ~/.cache/coco-annotation-tool/thumbnails)")
+    parser.add_argument("--startup-target", type=float, default=1500, metavar="MS",
+                        help="objectif de temps jusqu'à la première image, signalé s'il est dépassé (défaut: 1500)")
+    parser.add_argument("--profile", action="store_true",
+                        help="afficher les temps des gestionnaires sur le canvas (touche F12)")
+    parser.add_argument("--trace", metavar="FICHIER",
+                        help="écrire une trace Chrome (chrome://tracing) de la session à la fermeture")
+    parser.add_argument("--validate", metavar="DOSSIER",
+                        help="vérifier tout le dataset sans interface et écrire un rapport JSON")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="chemin du rapport de validation (défaut: DOSSIER/validation_report.json)")
+    parser.add_argument("--export-yolo", metavar="DOSSIER",
+                        help="exporter les labels YOLO-pose du dataset sans interface")
+    parser.add_argument("--output", metavar="DOSSIER",
+                        help="dossier des labels exportés (défaut: DOSSIER/labels)")
+    parser.add_argument("--force", action="store_true",
+                        help="réécrire tous les labels, même ceux des images inchangées")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="nombre de processus pour la validation ou l'export (défaut: nombre de cœurs)")
+    parser.add_argument("--compact-json", action="store_true",
+                        help="réécrire le fichier d'annotations sans indentation (plus petit et plus rapide)")
+    args = parser.parse_args()
+    
+    if args.export_yolo:
+        result = export_yolo(args.export_yolo, args.output, args.workers, args.force)
+        print(f"{result['written']} fichier(s) écrit(s), {result['skipped']} inchangé(s), "
+              f"{result['failed']} en échec -> {result['labels']}")
+        sys.exit(1 if result['failed'] else 0)
+    
+    if args.validate:
+        report = validate_dataset(args.validate, args.workers)
+        report_path = args.report or os.path.join(args.validate, "validation_report.json")
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"{report['images']} images, {report['annotations']} annotations, "
+              f"{len(report['issues'])} problème(s) -> {report_path}")
+        for code, count in sorted(report['summary'].items()):
+            print(f"  {code}: {count}")
+        sys.exit(1 if report['issues'] else 0)
+    
     root = tk.Tk()
-    app = CocoAnnotationTool(root)
+    app = CocoAnnotationTool(root, pyramid_cache_bytes=args.cache_mb * 1024 * 1024, prefetch_ahead=args.prefetch,
+                             profile=args.profile, trace_path=args.trace, thumbnail_dir=args.thumbnail_dir,
+                             compact_json=args.compact_json, geometry=args.geometry,
+                             startup_target_ms=args.startup_target if args.dataset else None)
+    if args.dataset:
+        app.open_dataset_when_shown(args.dataset, args.start)
     root.mainloop()
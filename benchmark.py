@@ -0,0 +1,532 @@
+"""Benchmark des chemins critiques de l'outil d'annotation
+
+Génère un dataset COCO synthétique, pilote CocoAnnotationTool (avec une
+couche Tk simulée, ou la vraie sous un affichage virtuel avec --tk) et
+mesure les latences du changement d'image, du déplacement, du zoom, du
+curseur de taille et de la sauvegarde. Les résultats sont écrits en JSON
+pour comparer les versions entre elles.
+
+    python3 benchmark.py --images 200 --width 3840 --height 2160 --people 10 -o resultats.json
+    xvfb-run python3 benchmark.py --tk
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+
+# ---------------------------------------------------------------------------
+# Couche Tk simulée
+# ---------------------------------------------------------------------------
+
+class StubWidget:
+    """Widget Tk inerte: toutes les méthodes non définies sont sans effet"""
+
+    def __init__(self, *args, **kwargs):
+        self.options = dict(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+    def config(self, **kwargs):
+        self.options.update(kwargs)
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key, "")
+
+    def get(self):
+        return self.options.get('value', "")
+
+
+class StubVariable:
+    def __init__(self, master=None, value=None, **kwargs):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class StubCanvas(StubWidget):
+    """Canvas simulé: conserve les objets et leurs tags pour que chaque appel ait un coût réaliste"""
+
+    def __init__(self, *args, width=1200, height=800, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.width = width
+        self.height = height
+        self.items = {}
+        self.tags = {}
+        self.ids = itertools.count(1)
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def winfo_reqwidth(self):
+        return 1
+
+    def winfo_reqheight(self):
+        return 1
+
+    def _create(self, kind, coords, options):
+        tags = options.pop('tags', ())
+        if isinstance(tags, str):
+            tags = (tags,)
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+        item = next(self.ids)
+        self.items[item] = [kind, list(coords), tuple(tags), options]
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(item)
+        return item
+
+    def create_oval(self, *coords, **options):
+        return self._create('oval', coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self._create('rectangle', coords, options)
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def create_image(self, *coords, **options):
+        return self._create('image', coords, options)
+
+    def _find(self, tag_or_id):
+        if tag_or_id == 'all':
+            return list(self.items)
+        if isinstance(tag_or_id, int):
+            return [tag_or_id] if tag_or_id in self.items else []
+        return list(self.tags.get(tag_or_id, ()))
+
+    def find_withtag(self, tag_or_id):
+        return tuple(self._find(tag_or_id))
+
+    def gettags(self, item):
+        return self.items[item][2] if item in self.items else ()
+
+    def delete(self, *tags_or_ids):
+        for tag_or_id in tags_or_ids:
+            for item in self._find(tag_or_id):
+                _, _, tags, _ = self.items.pop(item)
+                for tag in tags:
+                    self.tags[tag].discard(item)
+
+    def move(self, tag_or_id, dx, dy):
+        for item in self._find(tag_or_id):
+            coords = self.items[item][1]
+            for i in range(0, len(coords) - 1, 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+
+    def coords(self, tag_or_id, *coords):
+        items = self._find(tag_or_id)
+        if not items:
+            return []
+        if coords:
+            if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+                coords = coords[0]
+            self.items[items[0]][1] = list(coords)
+        return list(self.items[items[0]][1])
+
+    def itemconfig(self, tag_or_id, **options):
+        for item in self._find(tag_or_id):
+            self.items[item][3].update(options)
+
+    itemconfigure = itemconfig
+
+
+class StubRoot(StubWidget):
+    """Fenêtre principale simulée, avec une file de callbacks after() exécutée par pump()"""
+
+    def __init__(self):
+        super().__init__()
+        self.scheduled = []
+        self.ids = itertools.count(1)
+
+    def after(self, ms, func=None, *args):
+        if func is None:
+            time.sleep(ms / 1000)
+            return None
+        callback_id = f"after#{next(self.ids)}"
+        self.scheduled.append((time.perf_counter() + ms / 1000, callback_id, func, args))
+        return callback_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, callback_id):
+        self.scheduled = [entry for entry in self.scheduled if entry[1] != callback_id]
+
+    def pump(self):
+        """Exécute les callbacks arrivés à échéance"""
+        now = time.perf_counter()
+        due = [entry for entry in self.scheduled if entry[0] <= now]
+        self.scheduled = [entry for entry in self.scheduled if entry[0] > now]
+        for _, _, func, args in due:
+            func(*args)
+
+    def update(self):
+        self.pump()
+
+
+def install_tk_stub(dataset_path):
+    """Remplace tkinter par la couche simulée (à appeler avant d'importer app)"""
+    import tkinter as real_tk
+
+    tk = types.ModuleType('tkinter')
+    for name in dir(real_tk):
+        if name.isupper():
+            setattr(tk, name, getattr(real_tk, name))
+    tk.TclError = real_tk.TclError
+    tk.Tk = StubRoot
+    tk.Canvas = StubCanvas
+    tk.StringVar = tk.BooleanVar = tk.IntVar = tk.DoubleVar = StubVariable
+    for name in ('Frame', 'Label', 'Listbox', 'Entry', 'Scrollbar', 'Toplevel', 'Menu'):
+        setattr(tk, name, StubWidget)
+
+    ttk = types.ModuleType('tkinter.ttk')
+    for name in ('Frame', 'Button', 'Label', 'Scale', 'Separator', 'Radiobutton', 'Checkbutton',
+                 'Entry', 'Scrollbar', 'Combobox', 'Progressbar', 'Treeview'):
+        setattr(ttk, name, StubWidget)
+
+    filedialog = types.ModuleType('tkinter.filedialog')
+    filedialog.askdirectory = lambda **kwargs: dataset_path
+    filedialog.askopenfilename = lambda **kwargs: ""
+    filedialog.asksaveasfilename = lambda **kwargs: ""
+
+    messagebox = types.ModuleType('tkinter.messagebox')
+    for name in ('showinfo', 'showwarning', 'showerror'):
+        setattr(messagebox, name, lambda *args, **kwargs: None)
+    messagebox.askyesno = lambda *args, **kwargs: True
+
+    tk.ttk, tk.filedialog, tk.messagebox = ttk, filedialog, messagebox
+    sys.modules.update({
+        'tkinter': tk,
+        'tkinter.ttk': ttk,
+        'tkinter.filedialog': filedialog,
+        'tkinter.messagebox': messagebox,
+    })
+
+    from PIL import ImageTk
+
+    class StubPhotoImage:
+        """Remplace ImageTk.PhotoImage en conservant le coût de la copie des pixels"""
+
+        def __init__(self, image=None, **kwargs):
+            self.image = image
+            if image is not None:
+                image.tobytes()
+
+        def width(self):
+            return self.image.width
+
+        def height(self):
+            return self.image.height
+
+        def paste(self, image, *args):
+            self.image = image
+            image.tobytes()
+
+    ImageTk.PhotoImage = StubPhotoImage
+
+
+def patch_real_tk_dialogs(dataset_path):
+    """Avec le vrai Tk, remplace seulement les boîtes de dialogue bloquantes"""
+    from tkinter import filedialog, messagebox
+
+    filedialog.askdirectory = lambda **kwargs: dataset_path
+    for name in ('showinfo', 'showwarning', 'showerror'):
+        setattr(messagebox, name, lambda *args, **kwargs: None)
+
+
+# ---------------------------------------------------------------------------
+# Dataset synthétique
+# ---------------------------------------------------------------------------
+
+def generate_dataset(path, images, width, height, people, keypoints, seed):
+    """Écrit un dataset COCO synthétique (images JPEG et annotations.coco.json)"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    # Quelques images de base réutilisées pour ne pas passer le benchmark à encoder du JPEG
+    templates = []
+    for i in range(min(images, 8)):
+        noise = Image.effect_noise((width, height), 40 + 10 * i).convert('RGB')
+        gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        templates.append(Image.blend(noise, gradient, 0.5))
+
+    coco = {
+        'info': {'description': 'Dataset synthétique de benchmark'},
+        'images': [],
+        'annotations': [],
+        'categories': [{
+            'id': 1,
+            'name': 'person',
+            'keypoints': [f"kp_{k}" for k in range(keypoints)],
+            'skeleton': [[k, k + 1] for k in range(1, keypoints)],
+        }],
+    }
+    annotation_id = 1
+    for i in range(images):
+        file_name = f"frame_{i:06d}.jpg"
+        templates[i % len(templates)].save(os.path.join(path, file_name), quality=85)
+        coco['images'].append({'id': i + 1, 'file_name': file_name, 'width': width, 'height': height})
+
+        for _ in range(people):
+            center_x, center_y = rng.uniform(0, width), rng.uniform(0, height)
+            flat = []
+            for _ in range(keypoints):
+                flat += [round(min(max(center_x + rng.gauss(0, 80), 0), width)),
+                         round(min(max(center_y + rng.gauss(0, 160), 0), height)),
+                         rng.choice((0, 1, 2, 2, 2))]
+            xs, ys = flat[0::3], flat[1::3]
+            coco['annotations'].append({
+                'id': annotation_id,
+                'image_id': i + 1,
+                'category_id': 1,
+                'keypoints': flat,
+                'num_keypoints': sum(1 for v in flat[2::3] if v > 0),
+                'bbox': [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)],
+                'area': (max(xs) - min(xs)) * (max(ys) - min(ys)),
+                'iscrowd': 0,
+            })
+            annotation_id += 1
+
+    with open(os.path.join(path, 'annotations.coco.json'), 'w') as f:
+        json.dump(coco, f)
+
+
+def prepare_dataset(args):
+    """Réutilise le dataset de --dataset-dir s'il a été généré avec les mêmes paramètres"""
+    params = {key: getattr(args, key) for key in ('images', 'width', 'height', 'people', 'keypoints', 'seed')}
+    path = args.dataset_dir or tempfile.mkdtemp(prefix='coco-bench-')
+    params_path = os.path.join(path, 'benchmark-params.json')
+
+    if os.path.exists(params_path):
+        with open(params_path) as f:
+            if json.load(f) == params:
+                return path
+        # Dataset généré par un précédent benchmark avec d'autres paramètres: le remplacer
+        shutil.rmtree(path)
+    elif os.path.isdir(path) and os.listdir(path):
+        # Dossier qui n'a pas été créé par le benchmark (peut-être un vrai dataset): n'y rien effacer
+        raise SystemExit(f"{path} n'est pas vide et ne contient pas de dataset de benchmark: "
+                         "choisir un dossier vide ou inexistant pour --dataset-dir")
+
+    generate_dataset(path, seed=args.seed, **{k: v for k, v in params.items() if k != 'seed'})
+    with open(params_path, 'w') as f:
+        json.dump(params, f)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Mesures
+# ---------------------------------------------------------------------------
+
+class Event:
+    """Événement souris minimal passé aux gestionnaires de l'application"""
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def summarize(samples):
+    """Percentiles (en millisecondes) d'une série de durées en secondes"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets ailleurs
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, dataset_path):
+    import app
+
+    root = app.tk.Tk()
+    if args.tk:
+        root.geometry("1200x800")
+        root.update()
+    # Cache de miniatures propre à chaque exécution (démarrage à froid reproductible)
+    thumbnail_dir = tempfile.mkdtemp(prefix='coco-bench-thumbs-')
+    tool = app.CocoAnnotationTool(root, thumbnail_dir=thumbnail_dir)
+
+    def settle():
+        """Traite les entrées en attente de la prochaine frame, puis les callbacks Tk échus"""
+        tool.flush_input()
+        root.update()
+
+    def timed(samples, action):
+        start = time.perf_counter()
+        action()
+        settle()
+        samples.append(time.perf_counter() - start)
+
+    results = {}
+
+    start = time.perf_counter()
+    tool.load_dataset()
+    # Attendre la fin d'une éventuelle indexation en arrière-plan
+    while tool.store is not None and not tool.store.complete and tool.store.error is None:
+        settle()
+        time.sleep(0.001)
+    settle()
+    results['load_dataset_ms'] = (time.perf_counter() - start) * 1000
+    if tool.store is None or not len(tool.store):
+        raise RuntimeError("Le dataset n'a pas pu être chargé")
+
+    count = len(tool.store)
+    switch = []
+    for step in range(args.steps):
+        # Parcours aller-retour du dataset, au rythme d'un annotateur
+        forward = (step // max(1, count - 1)) % 2 == 0
+        timed(switch, tool.next_image if forward else tool.previous_image)
+        time.sleep(args.think_time / 1000)
+        settle()
+
+    center = Event(tool.canvas.winfo_width() // 2, tool.canvas.winfo_height() // 2)
+
+    zoom = []
+    for step in range(args.steps):
+        handler = tool.on_mouse_wheel_up if (step // 10) % 2 == 0 else tool.on_mouse_wheel_down
+        timed(zoom, lambda: handler(center))
+
+    tool.mode = "grab"
+    pan = []
+    tool.on_mouse_press(Event(center.x, center.y))
+    position = Event(center.x, center.y)
+    for step in range(args.steps):
+        direction = 1 if (step // 50) % 2 == 0 else -1
+        position = Event(position.x + 7 * direction, position.y + 3 * direction)
+        timed(pan, lambda: tool.on_mouse_drag(position))
+    tool.mode = "edit"
+
+    slider = []
+    for step in range(args.steps):
+        value = 1 + (step % 20)
+        timed(slider, lambda: tool.update_circle_radius(value))
+
+    # save: attente vue par l'interface; save_flush: jusqu'à la fin de l'écriture en arrière-plan
+    save = []
+    save_flush = []
+    for step in range(args.steps):
+        key = next(iter(tool.keypoints), None)
+        if key is not None:
+            x, y, v = tool.keypoints[key]
+            tool.keypoints[key] = (x + (1 if step % 2 else -1), y, v)
+        start = time.perf_counter()
+        timed(save, tool.save_annotations)
+        tool.flush_saves()
+        save_flush.append(time.perf_counter() - start)
+
+    compact = []
+    timed(compact, tool.store.compact)
+
+    results['metrics'] = {
+        'image_switch': summarize(switch),
+        'zoom_step': summarize(zoom),
+        'pan_step': summarize(pan),
+        'slider_change': summarize(slider),
+        'save': summarize(save),
+        'save_flush': summarize(save_flush),
+        'compact': summarize(compact),
+    }
+    tool.on_close()
+    shutil.rmtree(thumbnail_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des chemins critiques de l'outil d'annotation")
+    parser.add_argument('--images', type=int, default=50, help="nombre d'images du dataset")
+    parser.add_argument('--width', type=int, default=1920, help="largeur des images")
+    parser.add_argument('--height', type=int, default=1080, help="hauteur des images")
+    parser.add_argument('--people', type=int, default=3, help="personnes par image")
+    parser.add_argument('--keypoints', type=int, default=17, help="keypoints par personne")
+    parser.add_argument('--steps', type=int, default=100, help="mesures par scénario")
+    parser.add_argument('--think-time', type=float, default=0, help="pause (ms) entre deux changements d'image")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dataset-dir', help="dossier du dataset (réutilisé si les paramètres sont identiques)")
+    parser.add_argument('--tk', action='store_true', help="utiliser le vrai Tk (nécessite un affichage, ex. xvfb-run)")
+    parser.add_argument('-o', '--output', help="fichier JSON de sortie (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    dataset_path = prepare_dataset(args)
+    try:
+        if args.tk:
+            patch_real_tk_dialogs(dataset_path)
+        else:
+            install_tk_stub(dataset_path)
+        results = run(args, dataset_path)
+    finally:
+        if not args.dataset_dir:
+            shutil.rmtree(dataset_path, ignore_errors=True)
+
+    report = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tk': 'real' if args.tk else 'stub',
+        'params': {key: getattr(args, key) for key in
+                   ('images', 'width', 'height', 'people', 'keypoints', 'steps', 'think_time', 'seed')},
+        'load_dataset_ms': results['load_dataset_ms'],
+        'metrics': results['metrics'],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()